@@ -0,0 +1,110 @@
+""" benchmark.py
+    Benchmarks pairing and standings on seeded synthetic tournaments
+
+    Simulates swiss rounds with random results and drops for fields of several sizes,
+    and writes one JSON object per round to stdout (or a file), for example:
+    {"players": 256, "seed": 1, "round": 3, "active": 251, "pairingTime": 0.41, ...} """
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+import pairings
+from profiling import LogSink
+
+# the result of a simulated match, as (wins, losses, draws) for the first player
+results = [(2, 0, 0), (2, 1, 0), (1, 2, 0), (0, 2, 0), (1, 1, 1)]
+
+# returns the peak resident memory of this process so far, in kilobytes
+# each field size is simulated in a process of its own, so this is the peak for that size
+def peakMemory():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# returns the number of matchings solved to pair rounds so far, from the profiler's timer
+def matchingCount():
+    timer = pairings.profiler.snapshot()["timers"].get("pairing_matching")
+    if timer == None:
+        return 0
+    return timer["count"]
+
+# simulate a swiss tournament with the given number of players and rounds
+# dropRate is the chance that each player drops after each round
+# returns a list with one dictionary of measurements per round
+def simulate(numPlayers, numRounds, seed, dropRate):
+    random.seed(seed)
+    # the profiler counts the matchings solved; its measurements are read here, not logged
+    if pairings.profiler == None:
+        pairings.enableProfiling(LogSink(open(os.devnull, "w")))
+    tournament = pairings.Tournament(["player%d" % i for i in range(numPlayers)], True, numRounds, seed)
+    records = []
+    while tournament.roundNumber < tournament.numRounds:
+        record = {"players": numPlayers, "seed": seed, "round": tournament.roundNumber + 1,
+                  "active": len(tournament.participants)}
+
+        # pair the round; a round takes more than one matching when the sparse graph falls short
+        start = time.time()
+        numMatchings = matchingCount()
+        paired = tournament.pairRound()
+        record["pairingTime"] = time.time() - start
+        record["attempts"] = matchingCount() - numMatchings
+        record["paired"] = paired
+        if not paired:
+            records.append(record)
+            break
+
+        # report a random result for every match, then drop some players
+        start = time.time()
+        for m in tournament.matches:
+            if not m.completed:
+                wins, losses, draws = random.choice(results)
+                tournament.report(m.player1.name, wins, losses, draws)
+        for p in list(tournament.participants):
+            if random.random() < dropRate:
+                tournament.drop(p)
+        record["reportTime"] = time.time() - start
+
+        # compute standings
+        start = time.time()
+        tournament.standings()
+        record["standingsTime"] = time.time() - start
+        record["peakMemoryKB"] = peakMemory()
+        records.append(record)
+    return records
+
+# command line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pairings on synthetic swiss tournaments.")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=[64, 256, 1024], help="field sizes to simulate")
+    parser.add_argument("-r", "--rounds", type=int, help="number of rounds (default: log2 of the field size)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for fields and results")
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="chance of each player dropping after each round")
+    parser.add_argument("-o", "--output", help="file to write results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    if args.output != None:
+        out = open(args.output, "w")
+    for size in args.sizes:
+        numRounds = args.rounds
+        if numRounds == None:
+            numRounds = pairings.defaultRounds(size)
+        # a fresh process for each size, so its peak memory isn't that of a larger size before it
+        pool = multiprocessing.Pool(1)
+        try:
+            records = pool.apply(simulate, (size, numRounds, args.seed, args.drop_rate))
+        finally:
+            pool.close()
+            pool.join()
+        for record in records:
+            out.write(json.dumps(record, sort_keys=True) + "\n")
+        out.flush()
+    if out is not sys.stdout:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+""" bulk.py
+    Bulk input and output: streaming readers for rosters and results, and a compact columnar state file
+
+    Rosters and results are read from CSV files (with a header row) or JSON Lines files, one row
+    at a time, so files of any size can be loaded without holding them in memory:
+        roster:  name[,dropped]
+        results: round,player1,player2,wins1,wins2,draws   (an empty player2 is a bye)
+    A file with any other extension is read as a plain roster, one name per line.
+
+    The state file stores each column of the tournament state as one contiguous typed array,
+    after a JSON header giving the offset, type and length of every column. Each column is
+    loaded back with a single read straight into an array, without creating an object per row,
+    and since columns are aligned raw arrays the file can also be memory-mapped by other tools. """
+
+import array
+import csv
+import json
+import struct
+import sys
+
+from journal import encodeStrings
+
+
+# magic string and format version at the start of every state file
+magic = "TPSTATE"
+version = 1
+# columns start on multiples of this many bytes, so they can be memory-mapped as arrays
+alignment = 8
+
+# returns the format of a file from its extension: 'csv', 'jsonl' or 'text'
+def fileFormat(path):
+    if path.lower().endswith(".csv"):
+        return "csv"
+    if path.lower().endswith(".jsonl") or path.lower().endswith(".ndjson"):
+        return "jsonl"
+    return "text"
+
+# generate the rows of a CSV or JSON Lines file as dictionaries, one at a time
+def readRows(path):
+    f = open(path, "rb")
+    try:
+        if fileFormat(path) == "csv":
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield encodeStrings(json.loads(line))
+    finally:
+        f.close()
+
+# returns True for the values a file may use to mark a flag as set
+def isSet(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+# generate (name, dropped) for every participant in a roster file
+def readRoster(path):
+    if fileFormat(path) == "text":
+        f = open(path)
+        try:
+            for line in f:
+                if line.strip():
+                    yield line.strip(), False
+        finally:
+            f.close()
+        return
+    for row in readRows(path):
+        yield row["name"].strip(), isSet(row.get("dropped", ""))
+
+# generate (round, player1, player2, wins1, wins2, draws) for every match in a results file,
+# where wins1 are player1's wins; player2 is None for a bye
+def readResults(path):
+    for row in readRows(path):
+        player2 = row.get("player2")
+        if player2 != None:
+            player2 = str(player2).strip() or None
+        yield (int(row["round"]), row["player1"].strip(), player2,
+               int(row["wins1"]), int(row["wins2"]), int(row.get("draws") or 0))
+
+# write a state file
+# header is a dictionary of plain values; columns maps column names to arrays, or to lists of
+# strings, which are stored as a single block of text
+def writeColumns(path, header, columns):
+    layout = []
+    blocks = []
+    offset = 0
+    for name in sorted(columns):
+        column = columns[name]
+        if isinstance(column, array.array):
+            data = column.tostring()
+            layout.append([name, column.typecode, len(column), offset, len(data)])
+        else:
+            data = "\0".join(column)
+            layout.append([name, "str", len(column), offset, len(data)])
+        blocks.append(data)
+        offset += len(data)
+        # pad so the next column starts aligned
+        blocks.append("\0" * (-offset % alignment))
+        offset += -offset % alignment
+    info = json.dumps({"header": header, "columns": layout, "byteorder": sys.byteorder}, sort_keys=True)
+    # the columns start aligned after the fixed-size prefix and the header
+    start = len(magic) + struct.calcsize("<HI") + len(info)
+    info += " " * (-start % alignment)
+
+    f = open(path, "wb")
+    f.write(magic)
+    f.write(struct.pack("<HI", version, len(info)))
+    f.write(info)
+    for data in blocks:
+        f.write(data)
+    f.close()
+
+# read a state file written by writeColumns
+# returns (header, columns), with numeric columns as arrays and string columns as lists
+def readColumns(path):
+    f = open(path, "rb")
+    try:
+        if f.read(len(magic)) != magic:
+            raise ValueError("not a tournament state file: " + path)
+        fileVersion, infoLength = struct.unpack("<HI", f.read(struct.calcsize("<HI")))
+        if fileVersion != version:
+            raise ValueError("unsupported state file version: %d" % fileVersion)
+        info = encodeStrings(json.loads(f.read(infoLength)))
+        start = f.tell()
+        columns = {}
+        for name, typecode, length, offset, size in info["columns"]:
+            f.seek(start + offset)
+            if typecode == "str":
+                columns[name] = []
+                if length > 0:
+                    columns[name] = f.read(size).split("\0")
+            else:
+                column = array.array(typecode)
+                column.fromfile(f, length)
+                if info["byteorder"] != sys.byteorder:
+                    column.byteswap()
+                columns[name] = column
+        return info["header"], columns
+    finally:
+        f.close()
@@ -0,0 +1,87 @@
+""" journal.py
+    Append-only event journal and snapshots, so an interrupted tournament can be resumed
+
+    Every pairing, report, fix, drop and undrop is appended to the journal as one JSON line,
+    after a first line holding the state the tournament started from.
+    Snapshots of the whole tournament state are written next to it in a compact binary form,
+    together with the journal position they include; recovering loads the latest snapshot and
+    replays only the events after that position. """
+
+import cPickle
+import json
+import os
+
+
+""" class representing an open journal and its snapshot file
+    a new journal replaces any existing file; a resumed one is appended to """
+class Journal:
+    def __init__(self, path, snapshotPath=None, resume=False):
+        self.path = path
+        if snapshotPath == None:
+            snapshotPath = path + ".snapshot"
+        self.snapshotPath = snapshotPath
+        if resume:
+            self.file = open(path, "a")
+        else:
+            self.file = open(path, "w")
+
+    # append an event (a dictionary) to the journal
+    def record(self, event):
+        self.file.write(json.dumps(event, sort_keys=True) + "\n")
+        self.file.flush()
+
+    # write a snapshot of the tournament state, replacing the previous one
+    # the snapshot is written to a temporary file first, so a crash never leaves a partial snapshot
+    def writeSnapshot(self, state):
+        self.file.flush()
+        self.file.seek(0, os.SEEK_END)
+        snapshot = {"journalOffset": self.file.tell(), "state": state}
+        tempPath = self.snapshotPath + ".tmp"
+        f = open(tempPath, "wb")
+        cPickle.dump(snapshot, f, cPickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.rename(tempPath, self.snapshotPath)
+
+    # close the journal file
+    def close(self):
+        self.file.close()
+
+    # data
+    path = None
+    snapshotPath = None
+    file = None
+
+# convert the unicode strings json produces back into the byte strings used for names
+def encodeStrings(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [encodeStrings(v) for v in value]
+    if isinstance(value, dict):
+        return dict((encodeStrings(k), encodeStrings(v)) for k, v in value.items())
+    return value
+
+# read the latest snapshot of a journal, and the events recorded after it
+# returns (state, events)
+def readJournal(path, snapshotPath=None):
+    if snapshotPath == None:
+        snapshotPath = path + ".snapshot"
+    f = open(snapshotPath, "rb")
+    snapshot = cPickle.load(f)
+    f.close()
+    return snapshot["state"], list(readEvents(path, snapshot["journalOffset"]))
+
+# generate the events of a journal, starting at the given position
+def readEvents(path, offset=0):
+    f = open(path, "r")
+    try:
+        f.seek(offset)
+        for line in f:
+            # a crash can leave the last line half-written; it was never applied, so skip it
+            if not line.endswith("\n"):
+                break
+            yield encodeStrings(json.loads(line))
+    finally:
+        f.close()
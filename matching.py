@@ -0,0 +1,574 @@
+""" matching.py
+    Maximum-weight matching in general graphs, used to find pairings for a round
+
+    Implementation of Edmonds' blossom algorithm with Galil's O(n^3) primal-dual
+    weighted extension (following Van Rantwijk's well-known formulation).
+    Edge weights should be integers so that all dual arithmetic stays exact. """
+
+import multiprocessing
+import time
+
+# edge list of a parallelMatching worker process
+# it is set by the pool's initializer; forked workers inherit the edges with the process
+# instead of receiving a copy through a pipe, and the parent's copy is never touched, so
+# several threads can run parallelMatching at once
+sharedEdges = None
+
+
+# compute a maximum-weight matching of the graph given by 'edges'
+# edges is a list of (i, j, weight) tuples, where i and j are vertex numbers (0..n-1)
+# if maxCardinality is True, only maximum-cardinality matchings are considered
+# returns a list 'mate' such that mate[i] == j if i is matched to j, or -1 if unmatched
+def maxWeightMatching(edges, maxCardinality=False):
+    if not edges:
+        return []
+
+    # count vertices and find the largest edge weight
+    numEdges = len(edges)
+    numVertices = 0
+    for (i, j, w) in edges:
+        if i >= numVertices: numVertices = i + 1
+        if j >= numVertices: numVertices = j + 1
+    maxWeight = max(0, max(w for (i, j, w) in edges))
+
+    # endpoint[p] is the vertex at endpoint p; edge k has endpoints 2k and 2k+1
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * numEdges)]
+    # neighbend[v] lists the remote endpoints of the edges incident to v
+    neighbend = [[] for v in range(numVertices)]
+    for k in range(numEdges):
+        (i, j, w) = edges[k]
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+
+    # mate[v] is the remote endpoint of v's matched edge, or -1
+    mate = numVertices * [-1]
+    # label of each top-level vertex/blossom: 0 free, 1 S-vertex, 2 T-vertex
+    label = (2 * numVertices) * [0]
+    # the endpoint through which each labeled vertex/blossom got its label
+    labelend = (2 * numVertices) * [-1]
+    # the top-level blossom containing each vertex
+    inblossom = list(range(numVertices))
+    # blossom structure; blossoms are numbered numVertices..2*numVertices-1
+    blossomparent = (2 * numVertices) * [-1]
+    blossomchilds = (2 * numVertices) * [None]
+    blossombase = list(range(numVertices)) + numVertices * [-1]
+    blossomendps = (2 * numVertices) * [None]
+    # least-slack edges, used to compute the dual update
+    bestedge = (2 * numVertices) * [-1]
+    blossombestedges = (2 * numVertices) * [None]
+    unusedblossoms = list(range(numVertices, 2 * numVertices))
+    # dual variables (vertex duals are doubled so that everything stays integral)
+    dualvar = numVertices * [maxWeight] + numVertices * [0]
+    # allowedge[k] is True if edge k has zero slack
+    allowedge = numEdges * [False]
+    # queue of newly discovered S-vertices
+    queue = []
+
+    # return 2 * slack of edge k (does not work inside blossoms)
+    def slack(k):
+        (i, j, wt) = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * wt
+
+    # returns the leaf vertices of a blossom
+    # blossoms can be nested about as deep as the graph is large, so this and the other
+    # traversals of nested blossoms use an explicit stack rather than recursion
+    def blossomLeaves(b):
+        leaves = []
+        stack = [b]
+        while stack:
+            t = stack.pop()
+            if t < numVertices:
+                leaves.append(t)
+            else:
+                stack.extend(reversed(blossomchilds[t]))
+        return leaves
+
+    # assign label t to the top-level blossom containing vertex w, reached through endpoint p
+    def assignLabel(w, t, p):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            # b became an S-blossom; scan its vertices
+            queue.extend(blossomLeaves(b))
+        elif t == 2:
+            # b became a T-blossom; its mate becomes an S-vertex
+            base = blossombase[b]
+            assignLabel(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    # trace back from v and w to find a new blossom or an augmenting path
+    # returns the base vertex of the new blossom, or -1 for an augmenting path
+    def scanBlossom(v, w):
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            # look for a breadcrumb in v's blossom, or leave a new one
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            # trace one step back
+            if labelend[b] == -1:
+                # the base of blossom b is single; stop tracing this path
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                # b is a T-blossom; trace one more step back
+                v = endpoint[labelend[b]]
+            # alternate between both paths
+            if w != -1:
+                v, w = w, v
+        # remove breadcrumbs
+        for b in path:
+            label[b] = 1
+        return base
+
+    # construct a new blossom with the given base, containing edge k
+    def addBlossom(base, k):
+        (v, w, wt) = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        # create the blossom
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        # build the list of sub-blossoms, and the endpoints connecting them
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        # trace back from v to base
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        # trace back from w to base
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        # the new blossom is an S-blossom
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        # relabel vertices; former T-vertices must now be scanned
+        for v in blossomLeaves(b):
+            if label[inblossom[v]] == 2:
+                queue.append(v)
+            inblossom[v] = b
+        # compute the least-slack edges from the new blossom to each neighbouring S-blossom
+        bestedgeto = (2 * numVertices) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                nblists = [[p // 2 for p in neighbend[v]] for v in blossomLeaves(bv)]
+            else:
+                nblists = [blossombestedges[bv]]
+            for nblist in nblists:
+                for k in nblist:
+                    (i, j, wt) = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if bj != b and label[bj] == 1 and (bestedgeto[bj] == -1 or slack(k) < slack(bestedgeto[bj])):
+                        bestedgeto[bj] = k
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in bestedgeto if k != -1]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    # expand the given top-level blossom, and at the end of a stage, every sub-blossom
+    # with a zero dual inside it
+    def expandBlossom(b, endstage):
+        # blossoms being expanded, each with the index of the next sub-blossom to convert
+        stack = [[b, 0]]
+        while stack:
+            frame = stack[-1]
+            b = frame[0]
+            if frame[1] < len(blossomchilds[b]):
+                # convert the next sub-blossom into a top-level blossom
+                s = blossomchilds[b][frame[1]]
+                frame[1] += 1
+                blossomparent[s] = -1
+                if s < numVertices:
+                    inblossom[s] = s
+                elif endstage and dualvar[s] == 0:
+                    # expand this sub-blossom before going on with the rest
+                    stack.append([s, 0])
+                else:
+                    for v in blossomLeaves(s):
+                        inblossom[v] = s
+                continue
+            stack.pop()
+            finishExpansion(b, endstage)
+
+    # relabel the sub-blossoms of an expanded blossom if needed, then recycle its number
+    def finishExpansion(b, endstage):
+        # if expanding a T-blossom during a stage, relabel its sub-blossoms
+        if not endstage and label[b] == 2:
+            # find the sub-blossom through which b got its label
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                # start index is odd; go forward and wrap
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                # start index is even; go backward
+                jstep = -1
+                endptrick = 1
+            # move along the blossom until we get to the base
+            p = labelend[b]
+            while j != 0:
+                # relabel the T-sub-blossom
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assignLabel(endpoint[p ^ 1], 2, p)
+                # step to the next S-sub-blossom and note its forward endpoint
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                # step to the next T-sub-blossom
+                allowedge[p // 2] = True
+                j += jstep
+            # relabel the base T-sub-blossom without stepping through to its mate
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            # continue along the blossom until we get back to entrychild
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    # already labeled S through a neighbouring T-vertex
+                    j += jstep
+                    continue
+                for v in blossomLeaves(bv):
+                    if label[v] != 0:
+                        break
+                # if a sub-blossom contains a reachable vertex, assign its label
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assignLabel(v, 2, labelend[v])
+                j += jstep
+        # recycle the blossom number
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    # swap matched/unmatched edges along an alternating path through blossom b
+    # from vertex v to the base of the blossom
+    # sub-blossoms on the path are augmented from a stack; an outer blossom's edges may match
+    # vertices its sub-blossoms also match, so the edges are matched innermost first once
+    # every blossom has been walked, and bases are updated innermost first as well
+    def augmentBlossom(b, v):
+        stack = [(b, v)]
+        augmented = []
+        matched = []
+        while stack:
+            b, v = stack.pop()
+            augmented.append(b)
+            # find the immediate sub-blossom of b that contains v
+            t = v
+            while blossomparent[t] != b:
+                t = blossomparent[t]
+            # the first sub-blossom is augmented from v too
+            if t >= numVertices:
+                stack.append((t, v))
+            # decide in which direction to go around the blossom
+            i = j = blossomchilds[b].index(t)
+            if i & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            # move along the blossom until we get to the base
+            while j != 0:
+                # step to the next sub-blossom, to be augmented from the edge's endpoint
+                j += jstep
+                t = blossomchilds[b][j]
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                if t >= numVertices:
+                    stack.append((t, endpoint[p]))
+                # step to the next sub-blossom, to be augmented from the edge's other endpoint
+                j += jstep
+                t = blossomchilds[b][j]
+                if t >= numVertices:
+                    stack.append((t, endpoint[p ^ 1]))
+                # the edge connecting those sub-blossoms is matched
+                matched.append(p)
+            # rotate the sub-blossom list so the new base is at the front
+            blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+            blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        # sub-blossoms were walked after the blossoms containing them
+        for p in reversed(matched):
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        for b in reversed(augmented):
+            blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    # swap matched/unmatched edges along the augmenting path through edge k
+    def augmentMatching(k):
+        (v, w, wt) = edges[k]
+        for (s, p) in ((v, 2 * k + 1), (w, 2 * k)):
+            # match vertex s to endpoint p, then trace back from s until a single vertex
+            while True:
+                bs = inblossom[s]
+                # augment through the S-blossom from s to base
+                if bs >= numVertices:
+                    augmentBlossom(bs, s)
+                mate[s] = p
+                # trace one step back
+                if labelend[bs] == -1:
+                    # reached a single vertex; stop
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                # trace one more step back
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                # augment through the T-blossom from j to base
+                if bt >= numVertices:
+                    augmentBlossom(bt, j)
+                mate[j] = labelend[bt]
+                # keep the opposite endpoint; it will be assigned to mate[s] next time around
+                p = labelend[bt] ^ 1
+
+    # start from a greedy matching of maximum-weight edges; these are tight under the
+    # initial duals, so the algorithm's invariants hold and most stages are skipped
+    for k in range(numEdges):
+        (i, j, w) = edges[k]
+        if w == maxWeight and i != j and mate[i] == -1 and mate[j] == -1:
+            mate[i] = 2 * k + 1
+            mate[j] = 2 * k
+
+    # main loop: continue until no further improvement is possible
+    for t in range(numVertices):
+        # each iteration is a "stage": an augmenting path is found and the matching grows by one edge
+        label[:] = (2 * numVertices) * [0]
+        bestedge[:] = (2 * numVertices) * [-1]
+        blossombestedges[numVertices:] = numVertices * [None]
+        allowedge[:] = numEdges * [False]
+        queue[:] = []
+        # label single top-level blossoms as S
+        for v in range(numVertices):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assignLabel(v, 1, -1)
+        augmented = False
+        while True:
+            # continue labeling until all vertices reachable through an alternating path have a label
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbend[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    # ignore edges internal to a blossom
+                    if inblossom[v] == inblossom[w]:
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            # w is free; label it T and its mate S
+                            assignLabel(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            # w is an S-vertex; found a new blossom or an augmenting path
+                            base = scanBlossom(v, w)
+                            if base >= 0:
+                                addBlossom(base, k)
+                            else:
+                                augmentMatching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            # w is inside a T-blossom but not yet reached from an S-vertex
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        # keep track of the least-slack edge to a different S-blossom
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        # keep track of the least-slack edge to a free vertex
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+
+            if augmented:
+                break
+
+            # no augmenting path yet; compute the dual update delta
+            deltatype = -1
+            delta = deltaedge = deltablossom = None
+            # delta 1: minimum vertex dual
+            if not maxCardinality:
+                deltatype = 1
+                delta = min(dualvar[:numVertices])
+            # delta 2: minimum slack on any edge between an S-vertex and a free vertex
+            for v in range(numVertices):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 2
+                        deltaedge = bestedge[v]
+            # delta 3: half the minimum slack on any edge between a pair of S-blossoms
+            for b in range(2 * numVertices):
+                if blossomparent[b] == -1 and label[b] == 1 and bestedge[b] != -1:
+                    d = slack(bestedge[b]) // 2
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 3
+                        deltaedge = bestedge[b]
+            # delta 4: minimum z variable of any T-blossom
+            for b in range(numVertices, 2 * numVertices):
+                if blossombase[b] >= 0 and blossomparent[b] == -1 and label[b] == 2 and (deltatype == -1 or dualvar[b] < delta):
+                    delta = dualvar[b]
+                    deltatype = 4
+                    deltablossom = b
+            if deltatype == -1:
+                # no further improvement possible; max-cardinality optimum reached
+                deltatype = 1
+                delta = max(0, min(dualvar[:numVertices]))
+
+            # update dual variables according to delta
+            for v in range(numVertices):
+                if label[inblossom[v]] == 1:
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    dualvar[v] += delta
+            for b in range(numVertices, 2 * numVertices):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        dualvar[b] -= delta
+
+            # take action at the point where the minimum delta occurred
+            if deltatype == 1:
+                # no further improvement possible; optimum reached
+                break
+            elif deltatype == 2:
+                # use the least-slack edge to continue the search
+                allowedge[deltaedge] = True
+                (i, j, wt) = edges[deltaedge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                # use the least-slack edge to continue the search
+                allowedge[deltaedge] = True
+                (i, j, wt) = edges[deltaedge]
+                queue.append(i)
+            elif deltatype == 4:
+                # expand the least-z blossom
+                expandBlossom(deltablossom, False)
+
+        # stop when no more augmenting paths can be found
+        if not augmented:
+            break
+
+        # end of a stage; expand all S-blossoms which have dualvar = 0
+        for b in range(numVertices, 2 * numVertices):
+            if blossomparent[b] == -1 and blossombase[b] >= 0 and label[b] == 1 and dualvar[b] == 0:
+                expandBlossom(b, True)
+
+    # transform mate[] such that mate[v] is the vertex to which v is paired
+    for v in range(numVertices):
+        if mate[v] >= 0:
+            mate[v] = endpoint[mate[v]]
+    return mate
+
+# returns (number of matched edges, total weight) of a matching over the given edges
+def matchingScore(edges, mate):
+    count = 0
+    weight = 0
+    for (i, j, w) in edges:
+        if i < len(mate) and mate[i] == j:
+            count += 1
+            weight += w
+    return (count, weight)
+
+# initializer for parallelMatching's worker processes
+def setSharedEdges(edges):
+    global sharedEdges
+    sharedEdges = edges
+
+# worker for parallelMatching: match using only the shared edges between vertices at most
+# 'window' apart (or all of them if window is None); edges to keepVertex are always used
+# returns (score, mate)
+def windowMatching(args):
+    window, keepVertex = args
+    edges = sharedEdges
+    if window != None:
+        edges = [e for e in edges if abs(e[1] - e[0]) <= window or e[0] == keepVertex or e[1] == keepVertex]
+    mate = maxWeightMatching(edges, True)
+    return matchingScore(edges, mate), mate
+
+# compute a maximum-cardinality matching in several worker processes at once
+# one worker solves the whole graph; the others solve sparser graphs that only keep edges
+# between vertices close together in numbering (for pairings, close in the standings), which
+# is much faster but may miss a perfect matching or the best one
+# returns the whole graph's matching as soon as it is found, or a sparser graph's perfect
+# matching as soon as it is found if optimal is given and optimal(mate) is True (that is, the
+# caller can tell it is as good as any); once timeLimit seconds have passed, returns the best
+# perfect matching found so far instead, if there is one (and if accept is given, only one
+# for which accept(mate) is True)
+def parallelMatching(edges, numVertices, workers, timeLimit=None, keepVertex=None, accept=None, optimal=None):
+    windows = [None]
+    window = 8
+    while len(windows) < workers and window < numVertices:
+        windows.append(window)
+        window *= 4
+
+    pool = multiprocessing.Pool(len(windows), setSharedEdges, (edges,))
+    pending = [pool.apply_async(windowMatching, ((w, keepVertex),)) for w in windows]
+    deadline = None
+    if timeLimit != None:
+        deadline = time.time() + timeLimit
+    try:
+        results = {}
+        while True:
+            for w, result in zip(windows, pending):
+                if w not in results and result.ready():
+                    results[w] = result.get()
+                    mate = results[w][1]
+                    # the whole graph's matching is optimal; nothing can beat it
+                    if w == None:
+                        return mate
+                    if optimal != None and len(mate) == numVertices and -1 not in mate and optimal(mate):
+                        return mate
+            if deadline != None and time.time() >= deadline:
+                perfect = [r for r in results.values() if len(r[1]) == numVertices and -1 not in r[1]
+                           and (accept == None or accept(r[1]))]
+                if perfect:
+                    return max(perfect)[1]
+            pending[0].wait(0.01)
+    finally:
+        # stop any workers that are still searching
+        pool.terminate()
+        pool.join()
@@ -1,50 +1,129 @@
 """ pairings.py
     System for executing multiple rounds of match pairings """
 
+import argparse
+import array
+import csv
+import heapq
+import itertools
+import json
 import math
+import operator
 import random
-from random import shuffle
 import string
+import sys
+import time
+from bulk import readColumns, readResults, readRoster, writeColumns
+from journal import Journal, readJournal
+from matching import maxWeightMatching, parallelMatching
+from profiling import Profiler, makeSink
+from ratings import Ratings, matchScore, readRatings
+
+# source of unique integer ids for participants
+participantIds = itertools.count()
+
+# profiler collecting timers and counters, or None when profiling is off
+profiler = None
+
+# start collecting timers and counters, writing them to the given sink (see profiling.py)
+def enableProfiling(sink):
+    global profiler
+    profiler = Profiler(sink)
+    return profiler
 
 # function to compare scores for 2 participants; for sorting
+# match points first, then opponents' match-win percentage, own game-win percentage
+# and opponents' game-win percentage as tiebreakers
 def comp(p1, p2):
-    if p1.matchPoints() > p2.matchPoints(): return -1
-    elif p2.matchPoints() > p1.matchPoints(): return 1
-    
-    # first tiebreaker: opponents' match-win-percentages
+    return cmp(p1.standingsKey(), p2.standingsKey())
+
+# key function giving standings order (same order as comp); for sorting
+def standingsKey(p):
+    return p.standingsKey()
+
+# key function reading the standings key a participant has cached, for sorting a field whose
+# keys are known to be up to date (see refreshTiebreakers)
+cachedStandingsKey = operator.attrgetter("cachedTiebreakers")
+
+# compute the tiebreakers of every participant in a field whose cached ones are out of date
+# every participant's own percentages are computed only once and shared between all
+# of its opponents, instead of once per opponent
+def refreshTiebreakers(players):
+    percentages = {}
+    recomputed = 0
+    for p in players:
+        if p.cachedTiebreakers != None:
+            continue
+        recomputed += 1
+        omw = 0.0
+        ogw = 0.0
+        for opp in p.prevOpponents:
+            perc = percentages.get(opp.id)
+            if perc == None:
+                perc = percentages[opp.id] = (opp.matchWinPercentage(), opp.gameWinPercentage())
+            omw += perc[0]
+            ogw += perc[1]
+        if len(p.prevOpponents) > 0:
+            omw /= len(p.prevOpponents)
+            ogw /= len(p.prevOpponents)
+        if p.id not in percentages:
+            percentages[p.id] = (p.matchWinPercentage(), p.gameWinPercentage())
+        p.cachedTiebreakers = (-p.matchPoints(), -omw, -percentages[p.id][1], -ogw)
+    if profiler != None: profiler.count("tiebreaker_recomputations", recomputed)
+
+# compute tiebreakers for a whole field at once and return it in standings order
+# with a limit, only the best 'limit' participants are returned, found with a heap instead of
+# sorting the whole field
+def computeStandings(players, limit=None):
+    if profiler != None: start = time.time()
+    refreshTiebreakers(players)
+    if limit != None and limit < len(players):
+        standings = heapq.nsmallest(limit, players, key=cachedStandingsKey)
     else:
-        p1OMW = p1.opponentMatchWin()
-        p2OMW = p2.opponentMatchWin()
-        if p1OMW > p2OMW: return -1
-        elif p2OMW > p1OMW: return 1
-        
-        #second tiebreaker: own game-win-percentage
-        else:
-            if p1.gameWinPercentage() > p2.gameWinPercentage(): return -1
-            elif p2.gameWinPercentage() > p1.gameWinPercentage(): return 1
+        standings = sorted(players, key=cachedStandingsKey)
+    if profiler != None:
+        profiler.count("standings_sorted", len(standings))
+        profiler.addTime("standings", time.time() - start)
+    return standings
+
+# default number of rounds for a field (ceiling of the log of # of participants)
+def defaultRounds(numPlayers):
+    if numPlayers < 2:
+        return 0
+    return int(math.ceil(math.log(numPlayers, 2)))
 
-            # third tiebreaker: opponents' game-win-percentages
-            else:
-                p1OGW = p1.opponentGameWin()
-                p2OGW = p2.opponentGameWin()
-                if p1OGW > p2OGW: return -1
-                elif p2OGW > p1OGW: return 1
-    return 0
-    
 
 """ class representing a participant in the tournament
-    tracks own wins, losses, draws, as well as who it has played against """
-class Participant:
+    tracks own wins, losses, draws, as well as who it has played against
+    uses __slots__ so that large fields don't pay for a dict per participant """
+class Participant(object):
+    # data
+    __slots__ = ("id", "name", "prevOpponents", "opponentIds",
+                 "wins", "gameWins", "losses", "gameLosses", "draws", "gameDraws", "byes",
+                 "cachedTiebreakers")
+
     def __init__(self, newName):
         self.name = newName
+        self.id = next(participantIds)
         self.prevOpponents = []
+        # number of times each opponent has been played, by opponent id
+        self.opponentIds = {}
+        self.wins = 0
+        self.gameWins = 0
+        self.losses = 0
+        self.gameLosses = 0
+        self.draws = 0
+        self.gameDraws = 0
+        self.byes = 0
+        # standings key (see standingsKey), which holds the tiebreakers, or None when out of date
+        self.cachedTiebreakers = None
 
     # report a match result
     # records result in participant's records, as well as the opponent who was played
     def matchResult(self, match):
         # check order of participants: this branch if self is player1
         if match.player1.name == self.name:
-            self.prevOpponents.append(match.player2)
+            self.addOpponent(match.player2)
             if match.p1Wins > match.p2Wins:
                 self.wins += 1
             elif match.p2Wins > match.p1Wins:
@@ -55,7 +134,7 @@ class Participant:
             self.gameLosses += match.p2Wins
         # this branch if self is player2
         elif match.player2.name == self.name:
-            self.prevOpponents.append(match.player1)
+            self.addOpponent(match.player1)
             if match.p2Wins > match.p1Wins:
                 self.wins += 1
             elif match.p1Wins > match.p2Wins:
@@ -65,12 +144,14 @@ class Participant:
             self.gameWins += match.p2Wins
             self.gameLosses += match.p1Wins
         self.gameDraws += match.draws
+        self.invalidateTiebreakers()
 
     # undo a match result
     def undoMatchResult(self, match):
+        self.invalidateTiebreakers()
         # check order of participants: this branch if self is player1
         if match.player1.name == self.name:
-            self.prevOpponents.remove(match.player2)
+            self.removeOpponent(match.player2)
             if match.p1Wins > match.p2Wins:
                 self.wins -= 1
             elif match.p2Wins > match.p1Wins:
@@ -81,7 +162,7 @@ class Participant:
             self.gameLosses -= match.p2Wins
         # this branch if self is player2
         elif match.player2.name == self.name:
-            self.prevOpponents.remove(match.player1)
+            self.removeOpponent(match.player1)
             if match.p2Wins > match.p1Wins:
                 self.wins -= 1
             elif match.p1Wins > match.p2Wins:
@@ -92,6 +173,23 @@ class Participant:
             self.gameLosses -= match.p1Wins
         self.gameDraws -= match.draws
 
+    # record an opponent in this participant's pairing history
+    def addOpponent(self, p):
+        self.prevOpponents.append(p)
+        self.opponentIds[p.id] = self.opponentIds.get(p.id, 0) + 1
+
+    # remove an opponent from this participant's pairing history
+    def removeOpponent(self, p):
+        # the opponent being removed is almost always the most recent one
+        if self.prevOpponents[-1] is p:
+            self.prevOpponents.pop()
+        else:
+            self.prevOpponents.remove(p)
+        if self.opponentIds[p.id] == 1:
+            del self.opponentIds[p.id]
+        else:
+            self.opponentIds[p.id] -= 1
+
     # returns the number of match points for this participant
     # (3 per win, 1 per draw)
     def matchPoints(self):
@@ -113,9 +211,11 @@ class Participant:
         
     # check if this participant has played against another
     def hasPlayed(self, p2):
-        for p in self.prevOpponents:
-            if p.name == p2.name:
-                return True
+        return p2.id in self.opponentIds
+
+    # returns the ids in 'candidates' (a set of participant ids) this participant hasn't played
+    def legalOpponents(self, candidates):
+        return candidates.difference(self.opponentIds)
 
     # find opponents' match-win percentages
     def opponentMatchWin(self):
@@ -135,23 +235,38 @@ class Participant:
             perc /= len(self.prevOpponents)
         return perc
 
-    # data
-    name = ""
-    prevOpponents = []
-    wins = 0
-    gameWins = 0
-    losses = 0
-    gameLosses = 0
-    draws = 0
-    gameDraws = 0
-    byes = 0
+    # returns this participant's tiebreakers (OMW, GWP, OGWP)
+    def tiebreakers(self):
+        key = self.standingsKey()
+        return (-key[1], -key[2], -key[3])
+
+    # returns the key this participant is sorted by in the standings (best first):
+    # (-match points, -OMW, -GWP, -OGWP)
+    # it is only recomputed after a result involving this participant or an opponent changes
+    def standingsKey(self):
+        if self.cachedTiebreakers == None:
+            if profiler != None: profiler.count("tiebreaker_recomputations")
+            self.cachedTiebreakers = (-self.matchPoints(), -self.opponentMatchWin(), -self.gameWinPercentage(), -self.opponentGameWin())
+        return self.cachedTiebreakers
+
+    # clear the cached tiebreakers of this participant and of everyone who has played it,
+    # since their opponent percentages depend on this participant's record
+    def invalidateTiebreakers(self):
+        self.cachedTiebreakers = None
+        for p in self.prevOpponents:
+            p.cachedTiebreakers = None
 
 """ class representing a match in the tournament
     holds 2 participants
     accepts results via the report method """
-class Match:
+class Match(object):
+    # data
+    __slots__ = ("player1", "player2", "p1Wins", "p2Wins", "draws", "completed", "forfeited")
+
     def __init__(self, p1, p2):
         self.completed = False
+        # True if the match was forfeited by a player dropping
+        self.forfeited = False
         self.p1Wins = 0
         self.p2Wins = 0
         self.draws = 0
@@ -194,42 +309,231 @@ class Match:
 
     # get the losing participant
     def getLoser(self):
-        if p1Wins > p2Wins:
-            return player2
-        elif p2Wins > p1Wins:
-            return player1
+        if self.p1Wins > self.p2Wins:
+            return self.player2
+        elif self.p2Wins > self.p1Wins:
+            return self.player1
         else:
             return None
 
     # get the winning participant
     def getWinner(self):
-        if p1Wins > p2Wins:
-            return player1
-        elif p2Wins > p1Wins:
-            return player2
+        if self.p1Wins > self.p2Wins:
+            return self.player1
+        elif self.p2Wins > self.p1Wins:
+            return self.player2
         else:
             return None
 
-    # print the match details
-    def printMatch(self):
-        print self.player1.name, self.p1Wins, "vs.", self.player2.name, self.p2Wins, ",", self.draws, "draws"
+    # write the match details to a stream
+    def printMatch(self, stream):
+        stream.write("%s %d vs. %s %d , %d draws\n" % (self.player1.name, self.p1Wins, self.player2.name, self.p2Wins, self.draws))
+
+""" class indexing participants by match points, for building score groups """
+class ScoreGroups(object):
+    # data
+    __slots__ = ("groups", "pointsOf")
+
+    def __init__(self, players):
+        # match points -> participants with that many points, by id
+        self.groups = {}
+        # participant id -> the match points it is filed under
+        self.pointsOf = {}
+        for p in players:
+            self.add(p)
+
+    # add a participant to the group for its current match points
+    def add(self, p):
+        if p.id in self.pointsOf:
+            return
+        points = p.matchPoints()
+        if points not in self.groups:
+            self.groups[points] = {}
+        self.groups[points][p.id] = p
+        self.pointsOf[p.id] = points
+
+    # remove a participant from its group
+    def remove(self, p):
+        points = self.pointsOf.pop(p.id, None)
+        if points == None:
+            return
+        del self.groups[points][p.id]
+        if len(self.groups[points]) == 0:
+            del self.groups[points]
+
+    # move a participant whose match points changed into its new group
+    def update(self, p):
+        if p.id in self.pointsOf and self.pointsOf[p.id] != p.matchPoints():
+            self.remove(p)
+            self.add(p)
+
+    # returns the match points of every group, highest first
+    def scores(self):
+        return sorted(self.groups, reverse=True)
+
+    # returns the participants with the given match points
+    def group(self, points):
+        if points not in self.groups:
+            return []
+        return self.groups[points].values()
+
+    # returns the number of participants with the given match points
+    def size(self, points):
+        if points not in self.groups:
+            return 0
+        return len(self.groups[points])
 
+""" class representing a single-elimination bracket
+    built once from the seeded participants as an array-backed binary tree: node 1 is the final,
+    the matches feeding node k are nodes 2k and 2k+1, and the leaves hold the seeds
+    each node holds whoever has won there so far, so a result advances its winner in one step """
+class Bracket(object):
     # data
-    player1 = None
-    player2 = None
-    p1Wins = 0
-    p2Wins = 0
-    draws = 0
-    completed = False
+    __slots__ = ("size", "slots", "round", "nodes", "byePlayer")
+
+    # players should be in seed order, best first
+    def __init__(self, players, byePlayer):
+        self.size = 1
+        while self.size < len(players):
+            self.size *= 2
+        self.slots = (2 * self.size) * [None]
+        # seeds that don't exist are byes for the seeds they would have played
+        order = seedOrder(self.size)
+        for leaf in range(self.size):
+            if order[leaf] <= len(players):
+                self.slots[self.size + leaf] = players[order[leaf] - 1]
+        self.round = 0
+        # the node each of this round's matches decides
+        self.nodes = {}
+        self.byePlayer = byePlayer
+
+    # create the matches for the next round
+    # players whose ids aren't in 'active' have dropped; their opponents get a bye
+    def pairRound(self, active):
+        self.round += 1
+        self.nodes = {}
+        matches = []
+        first = self.size >> self.round
+        for k in range(first, 2 * first):
+            player1 = self.slots[2 * k]
+            player2 = self.slots[2 * k + 1]
+            if player1 != None and player1.id not in active: player1 = None
+            if player2 != None and player2.id not in active: player2 = None
+            if player1 == None and player2 == None:
+                continue
+            if player1 == None or player2 == None:
+                # bye: the remaining player advances straight away
+                player = player1 or player2
+                m = Match(player, self.byePlayer)
+                m.report(player.name, 2, 0, 0)
+                self.slots[k] = player
+            else:
+                m = Match(player1, player2)
+            self.nodes[m] = k
+            matches.append(m)
+        return matches
+
+    # move the winner of a reported (or fixed) match from this round into the next one
+    def advance(self, match):
+        self.slots[self.nodes[match]] = match.getWinner()
+
+    # returns the winner of the whole bracket, or None if it isn't decided yet
+    def champion(self):
+        return self.slots[1]
+
+    # write every round played so far to a stream, straight from the tree
+    def printBracket(self, stream):
+        for r in range(1, self.round + 1):
+            stream.write("Round %d :\n" % r)
+            first = self.size >> r
+            for k in range(first, 2 * first):
+                names = []
+                for child in (2 * k, 2 * k + 1):
+                    if self.slots[child] == None: names.append("bye")
+                    else: names.append(self.slots[child].name)
+                winner = "?"
+                if self.slots[k] != None: winner = self.slots[k].name
+                stream.write("%s vs. %s -> %s\n" % (names[0], names[1], winner))
+
+# returns the seed placed at each leaf of a bracket of the given size (a power of 2),
+# so that the top seeds can only meet in the latest rounds
+def seedOrder(size):
+    order = [1]
+    while len(order) < size:
+        order = [seed for s in order for seed in (s, 2 * len(order) + 1 - s)]
+    return order
 
 """ class representing the entire tournament
-    accepts input on creation giving a list of participants
+    can be created with a list of participant names and driven through pairRound, report,
+    fix and standings, or created with no arguments to ask for everything interactively
     creates and runs all the matches each round """
 class Tournament:
     # initialization
-    # guides user through inputting data about tournament
-    def __init__(self):
+    # with a list of participant names, sets up the tournament without asking for input;
+    # otherwise guides user through inputting data about tournament and runs it
+    # every random choice is made with the tournament's own generator, so the same seed (chosen
+    # at random if not given) and the same results always give the same pairings
+    # messages and printed matches and standings go to output; without prompts, nothing is
+    # printed unless an output stream is given
+    def __init__(self, players=None, swiss=True, rounds=None, seed=None, output=None):
+        if seed == None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.random = random.Random(seed)
         self.participants = []
+        self.dropped = []
+        # ids of dropped (and eliminated) participants, and each participant's position in
+        # self.participants or self.dropped as last noted, so that participants can be dropped
+        # and brought back without scanning the lists
+        self.droppedIds = set()
+        self.positions = {}
+        self.matches = []
+        # matches of every earlier round, by round
+        self.history = []
+        self.roundNumber = 0
+        self.numCompleted = 0
+        # indexes for resolving commands: participants by name, and this round's match by participant id
+        self.playersByName = {}
+        self.roundMatches = {}
+        # this round's matches forfeited by a player dropping, which repairPairings can re-pair
+        self.forfeits = set()
+        # every bye is recorded as a match against this participant, so repeat byes can be detected
+        self.byePlayer = Participant("bye")
+        # participants by match points, built when the first swiss round is paired
+        self.scoreGroups = None
+        # single-elimination bracket, built when the first round is paired
+        self.bracket = None
+        # players' ratings, updated as results are reported if set; with seedByRating, the first
+        # round is paired (or the bracket seeded) by rating instead of at random
+        self.ratings = None
+        self.seedByRating = False
+        # journal of events for recovery, if enabled with startJournal
+        self.journal = None
+        # number of processes used to search for pairings, and how long to wait for the best
+        # pairing before settling for one found by a faster, approximate search (in seconds)
+        self.pairingWorkers = 1
+        self.pairingTimeLimit = None
+        self.output = output
+
+        if players == None:
+            self.interactive = True
+            self.output = sys.stdout
+            self.interactiveSetup()
+            self.run()
+            return
+
+        self.interactive = False
+        self.isSwiss = swiss
+        for name in players:
+            self.addParticipant(name)
+        # shuffle participants list, to randomize seatings in case of draft
+        self.random.shuffle(self.participants)
+        if rounds == None:
+            rounds = defaultRounds(len(self.participants))
+        self.numRounds = rounds
+
+    # ask the user whether the tournament is swiss, who is playing, and for how many rounds
+    def interactiveSetup(self):
         # determine swiss vs. SE
         s = raw_input("Is this tournament swiss? (y/n) ")
         if s.lower() == "yes" or s.lower() == "y":
@@ -238,148 +542,725 @@ class Tournament:
             self.isSwiss = False
             
         # loop to enter all participants
-        print "Input participants' names, one at a time. Once all are entered, enter 'done'."
+        self.say("Input participants' names, one at a time. Once all are entered, enter 'done'.")
         while True:
             s = raw_input("Please enter a participant name, or 'done' to finish: ")
             if s == "done" or s == "Done":
                 break
-            p = Participant(s)
-            self.participants.append(p)
-        shuffle(self.participants)
+            self.addParticipant(s)
+        # shuffle participants list, to randomize seatings in case of draft
+        self.random.shuffle(self.participants)
 
         # determine number of rounds (ceiling of the log of # of participants)
-        self.numRounds = int(math.ceil(math.log(len(self.participants), 2)))
-        print "Number of rounds: ", self.numRounds
+        self.numRounds = defaultRounds(len(self.participants))
+        self.say("Number of rounds: ", self.numRounds)
         s = raw_input("Is this okay? (y/n) ")
         if s != "yes" and s != "Yes" and s != "y" and s != "Y":
             s = raw_input("How many do you want? ")
             self.numRounds = int(s)
 
+    # run every round, reading commands from the user
+    def run(self):
         # begin tournament
-        print "Beginning rounds:"
-        # shuffle participants list, to randomize seatings in case of draft
-        for i in range(1, int(self.numRounds + 1)):
-            success = False
-            bye = False
-            count = 0
-            # attempt to automatically make pairings; if this fails too much, it will need to be done manually
-            while not success and count < 1000:
-                success, bye = self.makePairings()
-                count += 1
-            # ask the user to guide the program through pairings
-            if not success:
-                success, bye = self.manualMakePairings()
-            # begin this round
-            print "Round", i, ":"
-            shuffle(self.matches)
-            self.printMatches()
-            numCompleted = 0
-            if bye: numCompleted += 1
+        self.say("Beginning rounds:")
+        while self.roundNumber < self.numRounds:
+            self.pairRound()
             done = False
             # execute input loop until all matches are marked completed and user enters 'done'
             while not done:
                 # if all matches are done, allow user to end round (or continue entering commands)
-                if numCompleted >= len(self.matches):
-                    print "Round completed:"
+                if self.roundComplete():
+                    self.say("Round completed:")
                     self.printMatches()
-                    print "When finished, enter 'done' to go to next round. Otherwise, enter more commands before next round."
+                    self.say("When finished, enter 'done' to go to next round. Otherwise, enter more commands before next round.")
                 # ask for command input
                 s = raw_input("Report results, query matches, query standings, or drop players ('help' for help): ")
-                # listen for commands
-                words = s.split()
-                # show commands help
-                if words[0].lower() == "help":
-                    print self.helptext # helptext defined at the bottom (it's messy)
-                # drop a participant
-                elif words[0].lower() == "drop":
-                    name = " ".join(words[1:])
-                    for p in self.participants:
-                        if p.name == name:
-                            self.drop(p)
-                # undrop a participant
-                elif words[0].lower() == "undrop":
-                    name = " ".join(words[1:])
-                    for p in self.dropped:
-                        if p.name == name:
-                            self.undrop(p)
-                # report a match result
-                elif words[0].lower() == "report":
-                    name = " ".join(words[4:])
-                    for m in self.matches:
-                        if not m.completed and (name == m.player1.name or name == m.player2.name):
-                            m.report(name, int(words[1]), int(words[2]), int(words[3]))
-                            # if not swiss, drop the loser
-                            if not self.isSwiss and name == m.player1.name:
-                                self.drop(m.player2)
-                            elif not self.isSwiss and name == m.player2.name:
-                                self.drop(m.player1)
-                            print name, "reported"
-                            numCompleted += 1
-                # fix a match result
-                elif words[0].lower() == "fix":
-                    name = " ".join(words[4:])
-                    for m in self.matches:
-                        if m.completed and (name == m.player1.name or name == m.player2.name):
-                            m.fix(name, int(words[1]), int(words[2]), int(words[3]))
-                            # if not swiss, add both players then drop the loser
-                            if not self.isSwiss:
-                                self.undrop(m.player1.name)
-                                self.undrop(m.player2.name)
-                                if name == m.player1.name:
-                                    self.drop(m.player2)
-                                elif name == m.player2.name:
-                                    self.drop(m.player1)
-                            print name, "fixed"
-                # display this round's matches
-                elif words[0].lower() == "matches":
-                    self.printMatches()
-                # display current standings
-                elif words[0].lower() == "standings":
-                    self.printStandings()
-                # if all matches are done, check for 'done' input to end round
-                elif numCompleted >= len(self.matches) and words[0].lower() == 'done':
-                    done = True
+                done = self.runCommand(s)
 
         # When all rounds complete, end tournament
         self.printStandings()
-        print "Tournament complete!"
-                
+        self.say("Tournament complete!")
+
+    # run every round, reading commands from a stream (such as a file or stdin) instead of the user
+    # the commands are the same as in interactive mode, one per line; 'done' ends a round
+    # a tournament resumed from a journal continues its current round
+    def runScript(self, stream):
+        self.say("Beginning rounds:")
+        if self.roundNumber == 0 and self.numRounds > 0:
+            self.pairRound()
+        for line in stream:
+            if self.runCommand(line):
+                if self.roundNumber >= self.numRounds:
+                    break
+                self.pairRound()
+        # the stream may end partway through the tournament, to be resumed later
+        if self.roundNumber >= self.numRounds and self.roundComplete():
+            self.printStandings()
+            self.say("Tournament complete!")
+
+    # add a participant to the tournament
+    def addParticipant(self, name):
+        p = Participant(name)
+        self.participants.append(p)
+        self.playersByName[p.name] = p
+        if self.scoreGroups != None:
+            self.scoreGroups.add(p)
+        return p
+
+    # pair the next round and print its matches
+    # returns False if no pairing without rematches was found and it can't be done manually
+    def pairRound(self):
+        if profiler != None: start = time.time()
+        # what pairing changes before it can fail, so that an error leaves the round as it was
+        numArchived = len(self.history)
+        matches = self.matches
+        randomState = self.random.getstate()
+        rated = None
+        if self.ratings != None:
+            rated = self.ratings.rated
+        try:
+            self.archiveRound()
+            seeded = self.roundNumber == 0 and self.seedByRating and self.ratings != None
+            if seeded:
+                self.participants.sort(key=lambda p: -self.ratings.rating(p.name))
+            if self.isSwiss and seeded:
+                success, bye = self.makeSeededPairings()
+            elif self.isSwiss:
+                # automatically make pairings; if no legal pairing exists, it will need to be done manually
+                success, bye = self.makePairings()
+                # ask the user to guide the program through pairings
+                if not success and self.interactive:
+                    success, bye = self.manualMakePairings()
+            else:
+                success, bye = self.makeBracketPairings()
+        except:
+            del self.history[numArchived:]
+            self.matches = matches
+            self.random.setstate(randomState)
+            if rated != None:
+                self.ratings.rated = rated
+            raise
+        if profiler != None: profiler.addTime("pairing", time.time() - start)
+        if not success:
+            if profiler != None: profiler.count("pairing_failures")
+            self.say("No pairings without rematches exist for this round.")
+            return False
+        # begin this round
+        self.roundNumber += 1
+        self.say("Round", self.roundNumber, ":")
+        self.random.shuffle(self.matches)
+        self.indexMatches()
+        self.forfeits = set()
+        self.printMatches()
+        self.numCompleted = self.countCompleted()
+        self.recordPairings()
+        if profiler != None: profiler.flush()
+        return True
+
+    # keep the finished round's matches, before the next round replaces them
+    def archiveRound(self):
+        if len(self.history) < self.roundNumber:
+            self.history.append(self.matches)
+            # results can only be fixed during their round
+            if self.ratings != None:
+                self.ratings.settle()
+
+    # returns the number of this round's matches that have been reported (byes are reported when paired)
+    def countCompleted(self):
+        return len([m for m in self.matches if m.completed])
+
+    # check if every match in this round has been reported
+    def roundComplete(self):
+        return self.numCompleted >= len(self.matches)
+
+    # report the result of this round's match for the participant with the given name,
+    # where wins1 are that participant's wins; returns False if there is no open match to report
+    def report(self, name, wins1, wins2, draws):
+        m = self.findMatch(name)
+        if m == None or m.completed:
+            return False
+        if not self.isSwiss and wins1 == wins2:
+            self.say("Single-elimination matches need a winner.")
+            return False
+        m.report(name, wins1, wins2, draws)
+        self.regroup(m)
+        self.rateMatch(m, False)
+        self.numCompleted += 1
+        self.recordEvent({"event": "report", "name": name, "wins1": wins1, "wins2": wins2, "draws": draws})
+        # if not swiss, advance the winner and eliminate the loser
+        if not self.isSwiss:
+            self.bracket.advance(m)
+            self.eliminate(m.getLoser())
+        self.say(name, "reported")
+        return True
+
+    # adjust the result of this round's already-reported match for the participant with the given name
+    # returns False if there is no such match
+    def fix(self, name, wins1, wins2, draws):
+        m = self.findMatch(name)
+        if m == None or not m.completed:
+            return False
+        if not self.isSwiss and wins1 == wins2:
+            self.say("Single-elimination matches need a winner.")
+            return False
+        m.fix(name, wins1, wins2, draws)
+        self.regroup(m)
+        self.rateMatch(m, True)
+        self.recordEvent({"event": "fix", "name": name, "wins1": wins1, "wins2": wins2, "draws": draws})
+        # if not swiss, bring back the previous loser, then advance the winner and eliminate the loser
+        if not self.isSwiss:
+            self.reinstate(m.player1)
+            self.reinstate(m.player2)
+            self.bracket.advance(m)
+            self.eliminate(m.getLoser())
+        self.say(name, "fixed")
+        return True
+
+    # returns all participants in standings order, followed by dropped participants in standings order
+    def standings(self):
+        self.participants = computeStandings(self.participants)
+        self.dropped = computeStandings(self.dropped)
+        return self.participants + self.dropped
+
+    # generate standings lazily, as (place, participant, dropped) tuples
+    # participants come first and dropped participants after them, as in printStandings
+    # with a limit, only the first 'limit' places are ranked and generated
+    def iterStandings(self, limit=None):
+        place = 0
+        for players, dropped in ((self.participants, False), (self.dropped, True)):
+            remaining = None
+            if limit != None:
+                remaining = limit - place
+                if remaining <= 0:
+                    return
+            for p in computeStandings(players, remaining):
+                place += 1
+                yield place, p, dropped
+
+    # returns the best k participants still in the tournament (for example, for a top 8 cut)
+    def topStandings(self, k):
+        return computeStandings(self.participants, k)
+
+    # returns one page of the standings, as (place, participant, dropped) tuples
+    # pages are numbered from 0
+    def standingsPage(self, page, pageSize=20):
+        return list(itertools.islice(self.iterStandings((page + 1) * pageSize), page * pageSize, None))
+
+    # write the standings to a stream one row at a time, as 'csv' or 'json'
+    # json output is a list of objects, one per participant
+    def exportStandings(self, stream, format="csv"):
+        columns = ["place", "name", "wins", "losses", "draws", "points", "dropped", "omw", "gwp", "ogwp"]
+        if format == "csv":
+            writer = csv.writer(stream)
+            writer.writerow(columns)
+        else:
+            stream.write("[")
+        for place, p, dropped in self.iterStandings():
+            omw, gwp, ogw = p.tiebreakers()
+            row = [place, p.name, p.wins, p.losses, p.draws, p.matchPoints(), dropped, omw, gwp, ogw]
+            if format == "csv":
+                writer.writerow(row)
+            else:
+                if place > 1:
+                    stream.write(",")
+                stream.write("\n" + json.dumps(dict(zip(columns, row)), sort_keys=True))
+        if format != "csv":
+            stream.write("\n]\n")
+
+    # run one command, as entered at the prompt
+    # returns True if the command ended the round
+    def runCommand(self, s):
+        # listen for commands
+        words = s.split()
+        if len(words) == 0:
+            return False
+        if profiler == None:
+            return self.executeCommand(words)
+        # time each kind of command separately
+        command = words[0].lower()
+        if command not in self.commands:
+            command = "other"
+        start = time.time()
+        try:
+            return self.executeCommand(words)
+        finally:
+            profiler.addTime("command_" + command, time.time() - start)
+
+    # run a command that has been split into words
+    def executeCommand(self, words):
+        # show commands help
+        if words[0].lower() == "help":
+            self.say(self.helptext) # helptext defined at the bottom (it's messy)
+        # drop a participant
+        elif words[0].lower() == "drop":
+            name = " ".join(words[1:])
+            if name in self.playersByName:
+                self.drop(self.playersByName[name])
+        # undrop a participant
+        elif words[0].lower() == "undrop":
+            name = " ".join(words[1:])
+            if name in self.playersByName:
+                self.undrop(self.playersByName[name])
+        # report a match result
+        elif words[0].lower() == "report":
+            self.report(" ".join(words[4:]), int(words[1]), int(words[2]), int(words[3]))
+        # fix a match result
+        elif words[0].lower() == "fix":
+            self.fix(" ".join(words[4:]), int(words[1]), int(words[2]), int(words[3]))
+        # display this round's matches
+        elif words[0].lower() == "matches":
+            self.printMatches()
+        # display current standings
+        elif words[0].lower() == "standings":
+            if len(words) > 1:
+                self.printStandings(int(words[1]))
+            else:
+                self.printStandings()
+        # display ratings
+        elif words[0].lower() == "ratings" and self.ratings != None:
+            ranking = self.ratings.ranking()
+            if len(words) > 1:
+                ranking = ranking[:int(words[1])]
+            for name, rating in ranking:
+                self.say("%s: %.1f" % (name, rating))
+        # write the ratings to a file
+        elif words[0].lower() == "export" and len(words) > 2 and words[1].lower() == "ratings" and self.ratings != None:
+            f = open(" ".join(words[2:]), "wb")
+            self.ratings.write(f)
+            f.close()
+            self.say("ratings exported")
+        # write the standings to a file
+        elif words[0].lower() == "export" and len(words) > 2 and words[1].lower() in ("csv", "json"):
+            f = open(" ".join(words[2:]), "w")
+            self.exportStandings(f, words[1].lower())
+            f.close()
+            self.say("standings exported")
+        # write the tournament state to a file
+        elif words[0].lower() == "save" and len(words) > 1:
+            self.saveState(" ".join(words[1:]))
+            self.say("state saved")
+        # check whether the next round can be paired without rematches
+        elif words[0].lower() == "check" and self.isSwiss:
+            numForced, unpaired = self.checkPairings()
+            self.printPairingCheck(numForced, unpaired)
+        # re-pair players left without a match by drops and undrops
+        elif words[0].lower() == "repair":
+            self.repairPairings()
+        # display the single-elimination bracket
+        elif words[0].lower() == "bracket" and self.bracket != None:
+            if self.output != None:
+                self.bracket.printBracket(self.output)
+        # if all matches are done, check for 'done' input to end round
+        elif self.roundComplete() and words[0].lower() == 'done':
+            return True
+        return False
+
+    # returns True if the participant is in the tournament and hasn't dropped or been eliminated
+    def isActive(self, player):
+        return self.playersByName.get(player.name) is player and player.id not in self.droppedIds
+
+    # move a participant from one of self.participants and self.dropped to the other; the last
+    # participant of the list it leaves takes its place, so the list isn't scanned or shifted
+    def moveParticipant(self, player, source, target):
+        i = self.positions.get(player.id)
+        if i == None or i >= len(source) or source[i] is not player:
+            # the list has been reordered (into standings order, for example) since the
+            # positions were noted, so note them again
+            for k in range(len(source)):
+                self.positions[source[k].id] = k
+            i = self.positions[player.id]
+        last = source.pop()
+        if last is not player:
+            source[i] = last
+            self.positions[last.id] = i
+        self.positions[player.id] = len(target)
+        target.append(player)
 
     # drop a player from the tournament
     def drop(self, player):
-        if player in self.participants:
-            self.participants.remove(player)
-            self.dropped.append(player)
-            # player forfeits any open matches
-            for m in self.matches:
-                if m.player1.name == player.name and not m.completed:
-                    m.report(player.name, 0, 2, 0)
-                elif m.player2.name == player.name and not m.completed:
-                    m.report(player.name, 2, 0, 0)
-            print player.name, "dropped"
+        if self.isActive(player):
+            self.moveParticipant(player, self.participants, self.dropped)
+            self.droppedIds.add(player.id)
+            if self.scoreGroups != None:
+                self.scoreGroups.remove(player)
+            # player forfeits any open match this round
+            m = self.roundMatches.get(player.id)
+            if m != None and not m.completed:
+                m.report(player.name, 0, 2, 0)
+                self.regroup(m)
+                m.forfeited = True
+                self.forfeits.add(m)
+                self.numCompleted += 1
+                if not self.isSwiss:
+                    self.bracket.advance(m)
+            self.recordEvent({"event": "drop", "name": player.name})
+            self.say(player.name, "dropped")
 
     # return a dropped player to the tournament
     def undrop(self, player):
-        if player in self.dropped:
-            self.participants.append(player)
-            self.dropped.remove(player)
-            print player.name, "undropped"
-        
+        if player.id in self.droppedIds:
+            self.moveParticipant(player, self.dropped, self.participants)
+            self.droppedIds.remove(player.id)
+            if self.scoreGroups != None:
+                self.scoreGroups.add(player)
+            self.recordEvent({"event": "undrop", "name": player.name})
+            self.say(player.name, "undropped")
+
+    # move a participant knocked out of a single-elimination bracket to the dropped list
+    def eliminate(self, player):
+        if self.isActive(player):
+            self.moveParticipant(player, self.participants, self.dropped)
+            self.droppedIds.add(player.id)
+            self.say(player.name, "eliminated")
+
+    # return an eliminated participant whose result was fixed
+    def reinstate(self, player):
+        if player.id in self.droppedIds:
+            self.moveParticipant(player, self.dropped, self.participants)
+            self.droppedIds.remove(player.id)
+
+    # start recording events to a journal at the given path, with snapshots at snapshotPath
+    # (by default, the journal path with '.snapshot' added); a snapshot is written every round
+    def startJournal(self, path, snapshotPath=None):
+        self.journal = Journal(path, snapshotPath)
+        # the journal starts with the whole state, so every round can be replayed (see replay.py)
+        self.journal.record({"event": "start", "seed": self.seed, "state": self.getState()})
+        self.journal.writeSnapshot(self.getState())
+
+    # restore the tournament from the latest snapshot of a journal, replay the events recorded
+    # after it, and continue recording to the same journal
+    def resume(self, path, snapshotPath=None):
+        state, events = readJournal(path, snapshotPath)
+        self.setState(state)
+        for event in events:
+            self.applyEvent(event)
+        self.journal = Journal(path, snapshotPath, True)
+
+    # append an event to the journal, if there is one
+    def recordEvent(self, event):
+        if self.journal != None:
+            self.journal.record(event)
+
+    # record this round's pairings, and snapshot the tournament at the start of the round
+    def recordPairings(self):
+        if self.journal == None:
+            return
+        pairs = []
+        byes = []
+        for m in self.matches:
+            if m.player2 is self.byePlayer:
+                byes.append(m.player1.name)
+            else:
+                pairs.append([m.player1.name, m.player2.name])
+        self.journal.record({"event": "pair", "round": self.roundNumber, "matches": pairs, "byes": byes})
+        self.journal.writeSnapshot(self.getState())
+
+    # apply an event read from a journal
+    def applyEvent(self, event):
+        if event["event"] == "pair":
+            self.archiveRound()
+            if self.isSwiss:
+                self.matches = []
+                for names in event["matches"]:
+                    self.matches.append(Match(self.playersByName[names[0]], self.playersByName[names[1]]))
+                for name in event["byes"]:
+                    m = Match(self.playersByName[name], self.byePlayer)
+                    m.report(name, 2, 0, 0)
+                    self.regroup(m)
+                    self.matches.append(m)
+            else:
+                # the bracket pairs the same way every time
+                self.makeBracketPairings()
+            self.numCompleted = self.countCompleted()
+            self.roundNumber = event["round"]
+            self.indexMatches()
+            self.forfeits = set()
+        elif event["event"] == "report":
+            self.report(event["name"], event["wins1"], event["wins2"], event["draws"])
+        elif event["event"] == "fix":
+            self.fix(event["name"], event["wins1"], event["wins2"], event["draws"])
+        elif event["event"] == "drop":
+            self.drop(self.playersByName[event["name"]])
+        elif event["event"] == "undrop":
+            self.undrop(self.playersByName[event["name"]])
+        elif event["event"] == "repair":
+            removed = [self.roundMatches[self.playersByName[name].id] for name in event["removed"]]
+            matches = [Match(self.playersByName[names[0]], self.playersByName[names[1]]) for names in event["matches"]]
+            matches.extend(Match(self.playersByName[name], self.byePlayer) for name in event["byes"])
+            self.replaceMatches(removed, matches)
+
+    # returns the tournament's state as plain data, for snapshots
+    # participants are referred to by id, so the state has no nested object references
+    def getState(self):
+        players = []
+        for p in [self.byePlayer] + self.participants + self.dropped:
+            players.append((p.id, p.name, p.wins, p.gameWins, p.losses, p.gameLosses, p.draws, p.gameDraws, p.byes,
+                            [opp.id for opp in p.prevOpponents]))
+        matches = []
+        for m in self.matches:
+            matches.append((m.player1.id, m.player2.id, m.p1Wins, m.p2Wins, m.draws, m.completed, m.forfeited))
+        ratings = None
+        if self.ratings != None:
+            ratings = self.ratings.getState()
+        history = []
+        for roundMatches in self.history:
+            history.append([(m.player1.id, m.player2.id, m.p1Wins, m.p2Wins, m.draws, m.completed, m.forfeited)
+                            for m in roundMatches])
+        bracket = None
+        if self.bracket != None:
+            slots = []
+            for p in self.bracket.slots:
+                if p == None: slots.append(None)
+                else: slots.append(p.id)
+            bracket = {"size": self.bracket.size, "round": self.bracket.round, "slots": slots,
+                       "nodes": [self.bracket.nodes.get(m) for m in self.matches]}
+        return {"isSwiss": self.isSwiss, "numRounds": self.numRounds, "roundNumber": self.roundNumber,
+                "numCompleted": self.numCompleted, "players": players,
+                "participants": [p.id for p in self.participants], "dropped": [p.id for p in self.dropped],
+                "matches": matches, "history": history, "bracket": bracket, "ratings": ratings,
+                "seedByRating": self.seedByRating, "seed": self.seed, "random": self.random.getstate()}
+
+    # restore the tournament's state from data returned by getState
+    def setState(self, state):
+        self.isSwiss = state["isSwiss"]
+        self.numRounds = state["numRounds"]
+        self.roundNumber = state["roundNumber"]
+        self.numCompleted = state["numCompleted"]
+        self.setRandomState(state)
+        # participants get new ids; map the saved ones onto them
+        byId = {}
+        for record in state["players"]:
+            p = Participant(record[1])
+            p.wins, p.gameWins, p.losses, p.gameLosses, p.draws, p.gameDraws, p.byes = record[2:9]
+            byId[record[0]] = p
+        for record in state["players"]:
+            p = byId[record[0]]
+            for oppId in record[9]:
+                p.addOpponent(byId[oppId])
+        self.byePlayer = byId[state["players"][0][0]]
+        self.participants = [byId[pid] for pid in state["participants"]]
+        self.dropped = [byId[pid] for pid in state["dropped"]]
+        self.droppedIds = set(p.id for p in self.dropped)
+        self.positions = {}
+        self.playersByName = {}
+        for p in self.participants + self.dropped:
+            self.playersByName[p.name] = p
+        self.history = []
+        for records in [state["matches"]] + state.get("history", []):
+            matches = []
+            for record in records:
+                m = Match(byId[record[0]], byId[record[1]])
+                m.p1Wins, m.p2Wins, m.draws, m.completed = record[2:6]
+                # snapshots from before forfeits were kept have no forfeit flag
+                m.forfeited = len(record) > 6 and record[6]
+                matches.append(m)
+            self.history.append(matches)
+        self.matches = self.history.pop(0)
+        self.indexMatches()
+        self.forfeits = set(m for m in self.matches if m.forfeited)
+        self.scoreGroups = None
+        self.ratings = None
+        if state.get("ratings") != None:
+            self.ratings = Ratings()
+            self.ratings.setState(state["ratings"])
+        self.seedByRating = state.get("seedByRating", False)
+        self.bracket = None
+        if state["bracket"] != None:
+            self.bracket = Bracket([], self.byePlayer)
+            self.bracket.size = state["bracket"]["size"]
+            self.bracket.round = state["bracket"]["round"]
+            self.bracket.slots = [byId.get(pid) for pid in state["bracket"]["slots"]]
+            for m, node in zip(self.matches, state["bracket"]["nodes"]):
+                if node != None:
+                    self.bracket.nodes[m] = node
+
+    # load the results of earlier swiss rounds, as (round, player1, player2, wins1, wins2, draws)
+    # tuples in round order, such as those generated by bulk.readResults; players who haven't
+    # been entered yet are added
+    # the last round loaded becomes the current round, so the next round paired follows it
+    def importResults(self, results):
+        for roundNumber, name1, name2, wins1, wins2, draws in results:
+            if roundNumber != self.roundNumber:
+                if roundNumber < self.roundNumber:
+                    raise ValueError("results must be in round order")
+                self.archiveRound()
+                while len(self.history) < roundNumber - 1:
+                    self.history.append([])
+                self.matches = []
+                self.roundNumber = roundNumber
+            player1 = self.playersByName.get(name1) or self.addParticipant(name1)
+            player2 = self.byePlayer
+            if name2 != None:
+                player2 = self.playersByName.get(name2) or self.addParticipant(name2)
+            m = Match(player1, player2)
+            m.report(name1, wins1, wins2, draws)
+            self.rateMatch(m, False)
+            self.matches.append(m)
+        self.indexMatches()
+        self.forfeits = set()
+        self.scoreGroups = None
+        self.numCompleted = self.countCompleted()
+
+    # returns the tournament's state as (header, columns) for a state file (see bulk.py):
+    # one array per participant field and per match field, covering every round so far
+    # matches and the bracket refer to participants by their position in the columns; the bye
+    # participant is always last, so it is also position -1
+    def getColumns(self):
+        players = self.participants + self.dropped + [self.byePlayer]
+        index = {}
+        for i in range(len(players)):
+            index[players[i].id] = i
+        index[self.byePlayer.id] = -1
+        columns = {"players.name": [p.name for p in players],
+                   "players.dropped": array.array("b", [0] * len(self.participants) + [1] * len(self.dropped) + [0])}
+        for field in self.playerFields:
+            columns["players." + field] = array.array("i", [getattr(p, field) for p in players])
+
+        rounds = self.history + [self.matches]
+        fields = [("round", "i"), ("player1", "i"), ("player2", "i"), ("wins1", "i"), ("wins2", "i"),
+                  ("draws", "i"), ("completed", "b"), ("forfeit", "b"), ("node", "i")]
+        for field, typecode in fields:
+            columns["matches." + field] = array.array(typecode)
+        nodes = {}
+        if self.bracket != None:
+            nodes = self.bracket.nodes
+        for r in range(len(rounds)):
+            for m in rounds[r]:
+                row = (r + 1, index[m.player1.id], index[m.player2.id], m.p1Wins, m.p2Wins, m.draws,
+                       m.completed, m.forfeited, nodes.get(m, -1))
+                for (field, typecode), value in zip(fields, row):
+                    columns["matches." + field].append(value)
+
+        header = {"isSwiss": self.isSwiss, "numRounds": self.numRounds, "roundNumber": self.roundNumber,
+                  "numCompleted": self.numCompleted, "bracket": None, "ratings": None,
+                  "seedByRating": self.seedByRating, "seed": self.seed, "random": self.random.getstate()}
+        if self.ratings != None:
+            header["ratings"] = self.ratings.getState()
+        if self.bracket != None:
+            header["bracket"] = {"size": self.bracket.size, "round": self.bracket.round}
+            slots = [-1 if p == None else index[p.id] for p in self.bracket.slots]
+            columns["bracket.slots"] = array.array("i", slots)
+        return header, columns
+
+    # restore the tournament's state from data returned by getColumns
+    def setColumns(self, header, columns):
+        self.isSwiss = header["isSwiss"]
+        self.numRounds = header["numRounds"]
+        self.roundNumber = header["roundNumber"]
+        self.numCompleted = header["numCompleted"]
+        self.setRandomState(header)
+        players = [Participant(name) for name in columns["players.name"]]
+        for field in self.playerFields:
+            values = columns["players." + field]
+            for i in range(len(players)):
+                setattr(players[i], field, values[i])
+        self.byePlayer = players[-1]
+        dropped = columns["players.dropped"]
+        self.participants = [players[i] for i in range(len(players) - 1) if not dropped[i]]
+        self.dropped = [players[i] for i in range(len(players) - 1) if dropped[i]]
+        self.droppedIds = set(p.id for p in self.dropped)
+        self.positions = {}
+        self.playersByName = {}
+        for p in players[:-1]:
+            self.playersByName[p.name] = p
+
+        # rebuild every round's matches, and each participant's opponents from the completed ones
+        rounds = [[] for r in range(max(self.roundNumber, 1))]
+        self.forfeits = set()
+        nodes = {}
+        player1s, player2s = columns["matches.player1"], columns["matches.player2"]
+        for k in range(len(player1s)):
+            m = Match(players[player1s[k]], players[player2s[k]])
+            m.p1Wins = columns["matches.wins1"][k]
+            m.p2Wins = columns["matches.wins2"][k]
+            m.draws = columns["matches.draws"][k]
+            m.completed = bool(columns["matches.completed"][k])
+            if m.completed:
+                m.player1.addOpponent(m.player2)
+                m.player2.addOpponent(m.player1)
+            m.forfeited = bool(columns["matches.forfeit"][k])
+            if m.forfeited and columns["matches.round"][k] == self.roundNumber:
+                self.forfeits.add(m)
+            if columns["matches.node"][k] != -1:
+                nodes[m] = columns["matches.node"][k]
+            rounds[columns["matches.round"][k] - 1].append(m)
+        self.history = rounds[:-1]
+        self.matches = rounds[-1]
+        self.indexMatches()
+        self.scoreGroups = None
+        self.ratings = None
+        if header.get("ratings") != None:
+            self.ratings = Ratings()
+            self.ratings.setState(header["ratings"])
+        self.seedByRating = header.get("seedByRating", False)
+
+        self.bracket = None
+        if header["bracket"] != None:
+            self.bracket = Bracket([], self.byePlayer)
+            self.bracket.size = header["bracket"]["size"]
+            self.bracket.round = header["bracket"]["round"]
+            self.bracket.slots = [None if i == -1 else players[i] for i in columns["bracket.slots"]]
+            self.bracket.nodes = nodes
+
+    # restore the seed and the generator's state from a snapshot or state file
+    # (the generator's state may have been through JSON, which turns its tuples into lists)
+    def setRandomState(self, state):
+        if state.get("seed") == None:
+            return
+        self.seed = state["seed"]
+        version, internal, gauss = state["random"]
+        self.random = random.Random()
+        self.random.setstate((version, tuple(internal), gauss))
+
+    # write the tournament's state to a state file
+    def saveState(self, path):
+        header, columns = self.getColumns()
+        writeColumns(path, header, columns)
+
+    # restore the tournament from a state file
+    def loadState(self, path):
+        header, columns = readColumns(path)
+        self.setColumns(header, columns)
+
+    # rebuild the index from participant ids to this round's matches
+    def indexMatches(self):
+        self.roundMatches = {}
+        for m in self.matches:
+            self.roundMatches[m.player1.id] = m
+            self.roundMatches[m.player2.id] = m
+
+    # find this round's match for the participant with the given name, or None
+    def findMatch(self, name):
+        if profiler != None: profiler.count("lookups")
+        player = self.playersByName.get(name)
+        if player == None:
+            return None
+        return self.roundMatches.get(player.id)
+
+    # write a line to the output, if there is one, made of the values separated by spaces
+    def say(self, *values):
+        if self.output != None:
+            self.output.write(" ".join(str(value) for value in values) + "\n")
+
     # print all matches
     def printMatches(self):
+        if self.output == None:
+            return
         for m in self.matches:
-            m.printMatch()
+            m.printMatch(self.output)
 
     # print all participants in point order, with tiebreakers
     # sample formatting: 'bob: 0-2-0 drop; OMW: 0.27, GWP: 0.35, OGWP: 0.67'
-    def printStandings(self):
-        self.participants.sort(cmp = comp)
-        self.dropped.sort(cmp = comp)
-        for p in self.participants:
-            print "%s: %d-%d-%d; OMW: %.2f, GWP: %.2f, OGWP: %.2f" % (p.name, p.wins, p.losses, p.draws, p.opponentMatchWin(), p.gameWinPercentage(), p.opponentGameWin())
-            #p.name, ":", p.wins, "-", p.losses, "-", p.draws, "; OMW:", p.opponentMatchWin(), ", GWP:", p.gameWinPercentage(), ", OGWP:", p.opponentGameWin()
-        for p in self.dropped:
-            print "%s: %d-%d-%d drop; OMW: %.2f, GWP: %.2f, OGWP: %.2f" % (p.name, p.wins, p.losses, p.draws, p.opponentMatchWin(), p.gameWinPercentage(), p.opponentGameWin())
+    # with a limit, only the first 'limit' places are printed
+    def printStandings(self, limit=None):
+        if self.output == None:
+            return
+        for place, p, dropped in self.iterStandings(limit):
+            omw, gwp, ogw = p.tiebreakers()
+            if not dropped:
+                self.say("%s: %d-%d-%d; OMW: %.2f, GWP: %.2f, OGWP: %.2f" % (p.name, p.wins, p.losses, p.draws, omw, gwp, ogw))
+            else:
+                self.say("%s: %d-%d-%d drop; OMW: %.2f, GWP: %.2f, OGWP: %.2f" % (p.name, p.wins, p.losses, p.draws, omw, gwp, ogw))
 
     # check if the remaining 2 players in a bracket are the only 2 with that record (in which case return false)
     def checkDuplicates(self, bracket):
@@ -390,57 +1271,435 @@ class Tournament:
         if bracket[0].matchPoints() != bracket[1].matchPoints():
             return False
         # check for others in tournament with same points
-        for p in self.participants:
-            if p.matchPoints == bracket[0].matchPoints:
-                return True
-        # no extra duplicates found; return false
-        return False
+        return self.getScoreGroups().size(bracket[0].matchPoints()) > 2
 
-    # create pairings for an abstract round
-    def makePairings(self):
-        self.participants.sort(cmp=comp)
+    # returns the score group index, building it from the current standings the first time
+    def getScoreGroups(self):
+        if self.scoreGroups == None:
+            self.scoreGroups = ScoreGroups(self.participants)
+        return self.scoreGroups
+
+    # move the players of a match whose result changed into their new score groups
+    def regroup(self, match):
+        if self.scoreGroups != None:
+            self.scoreGroups.update(match.player1)
+            self.scoreGroups.update(match.player2)
+
+    # update ratings for a reported or fixed match of this round; byes and forfeits aren't rated
+    def rateMatch(self, match, fixed):
+        if self.ratings == None or match.player2 is self.byePlayer or match in self.forfeits:
+            return
+        # a participant plays at most one match per round
+        key = "%d:%s" % (self.roundNumber, match.player1.name)
+        score = matchScore(match.p1Wins, match.p2Wins)
+        if fixed:
+            self.ratings.fix(key, score)
+        else:
+            self.ratings.rate(key, match.player1.name, match.player2.name, score)
+
+    # take back the result of one of this round's matches, as if it had never been reported
+    def unreport(self, match):
+        match.player1.undoMatchResult(match)
+        match.player2.undoMatchResult(match)
+        match.completed = False
+        self.regroup(match)
+
+    # create the next round's matches from the single-elimination bracket,
+    # which is built from the current order of participants the first time
+    def makeBracketPairings(self):
+        if self.bracket == None:
+            self.bracket = Bracket(self.participants, self.byePlayer)
+        active = set(p.id for p in self.participants)
+        self.matches = self.bracket.pairRound(active)
+        bye = False
+        for m in self.matches:
+            if m.player2 is self.byePlayer: bye = True
+        return True, bye
+
+    # pair the first round by rating, with participants sorted highest first: the top half of the
+    # field plays the bottom half in order, and the lowest-rated participant gets the bye
+    def makeSeededPairings(self):
+        self.matches = []
+        players = list(self.participants)
         bye = None
+        if len(players) % 2 == 1:
+            bye = players.pop()
+        half = len(players) // 2
+        for i in range(half):
+            self.matches.append(Match(players[i], players[half + i]))
+        if bye != None:
+            m = Match(bye, self.byePlayer)
+            m.report(bye.name, 2, 0, 0)
+            self.regroup(m)
+            self.matches.append(m)
+            return True, True
+        return True, False
+
+    # create pairings for an abstract round
+    # pairings are found in one pass as a maximum-weight matching over the graph of legal
+    # (not yet played) pairings; pairing across score groups is penalized, so players only
+    # float down when their own group can't be paired among itself
+    # the graph is first built with edges only to a few nearby players within and between
+    # adjacent score groups; only if that can't be paired completely, or its pairing floats
+    # more than penaltyBound shows is needed, is it built again with every possible edge, once
+    # checkPairings has shown that a complete pairing exists; if it doesn't, relaxPairings
+    # takes over
+    # with numForced (from checkPairings) above 0, pairs that would be rematches are allowed,
+    # and exactly that many, the fewest possible, are made
+    def makePairings(self, numForced=0):
+        relaxed = numForced > 0
         self.matches = []
-        numPaired = 0
-        bracket = []
-        furthestPaired = 0
-        # make pairings until all participants are paired
-        while numPaired < len(self.participants) and furthestPaired < len(self.participants):
-            # find other participants in this "bracket" (same score)
-            bracketScore = self.participants[furthestPaired].matchPoints()
-            for i in range(len(self.participants)):
-                if self.participants[i].matchPoints() == bracketScore:
-                    bracket.append(self.participants[i])
-                    if i > furthestPaired: furthestPaired = i
-            while(len(bracket) > 1):
-                p1 = random.randint(1, len(bracket) - 1)
-                player1 = bracket[0]
-                player2 = bracket[p1]
-                if player1.hasPlayed(player2): #len(bracket) == 2 and player1.hasPlayed(player2):
-                    #if self.checkDuplicates(bracket):
-                    return False, False
-                    #break
-                if player1.hasPlayed(player2): continue
-                m = Match(player1, player2)
+        if len(self.participants) == 0:
+            return True, False
+
+        # lay out the players score group by score group, from the top
+        groups = self.getScoreGroups()
+        players = []
+        group = []
+        groupIds = []
+        for points in groups.scores():
+            # the order within a group breaks ties between equally good pairings; it is drawn
+            # from the tournament's generator, rather than left to the order results came in,
+            # so that pairings can be reproduced
+            bucket = sorted(groups.group(points), key=lambda p: p.name)
+            self.random.shuffle(bucket)
+            players.extend(bucket)
+            group.extend([len(groupIds)] * len(bucket))
+            groupIds.append(set(p.id for p in bucket))
+
+        for adjacentOnly in (True, False):
+            if relaxed and adjacentOnly:
+                continue
+            # searching every legal pairing is slow, so first make sure there is one to find
+            if not relaxed and not adjacentOnly:
+                numForced, unpaired = self.checkPairings()
+                if numForced > 0:
+                    return self.relaxPairings(numForced, unpaired)
+            if profiler != None: start = time.time()
+            edges, numVertices, byeVertex = self.pairingGraph(players, group, groupIds, adjacentOnly, relaxed)
+            if profiler != None:
+                profiler.addTime("pairing_graph", time.time() - start)
+                profiler.count("pairing_edges", len(edges))
+                start = time.time()
+            if self.pairingWorkers > 1:
+                accept = None
+                if relaxed:
+                    # the faster, approximate searches can't weigh rematches against the whole
+                    # graph, so only accept one of theirs that makes no more rematches than needed
+                    accept = lambda mate: self.countRematches(players, mate, byeVertex) == numForced
+                # a pairing that floats no more players than penaltyBound shows is needed (and
+                # makes no more rematches than needed) can't be beaten, so there's no need to
+                # wait for the whole graph's matching
+                bound = self.penaltyBound(groupIds)
+                optimal = lambda mate: (self.pairingPenalty(group, mate, byeVertex) == bound
+                                        and (accept == None or accept(mate)))
+                mate = parallelMatching(edges, numVertices, self.pairingWorkers, self.pairingTimeLimit, byeVertex,
+                                        accept, optimal)
+            else:
+                mate = maxWeightMatching(edges, True)
+            if profiler != None: profiler.addTime("pairing_matching", time.time() - start)
+            # every vertex must be matched, otherwise a rematch can't be avoided
+            if len(mate) == numVertices and -1 not in mate:
+                # the sparse graph may have left out a pairing that floats fewer players; its
+                # pairing is only kept when no pairing at all could do better
+                if not adjacentOnly or self.pairingPenalty(group, mate, byeVertex) == self.penaltyBound(groupIds):
+                    break
+        else:
+            return False, False
+
+        bye = None
+        for i in range(len(players)):
+            if mate[i] == byeVertex:
+                bye = players[i]
+            elif mate[i] > i:
+                m = Match(players[i], players[mate[i]])
                 self.matches.append(m)
-                bracket.remove(player1)
-                bracket.remove(player2)
-                numPaired += 2
-            if len(bracket) == 1 and numPaired == len(self.participants) - 1:
-                bye = bracket[0]
-                numPaired += 1
-            furthestPaired += 1
-            
+
         if bye != None:
-            m = Match(bye, Participant("bye"))
+            m = Match(bye, self.byePlayer)
             m.report(bye.name, 2, 0, 0)
+            self.regroup(m)
             self.matches.append(m)
             return True, True
         return True, False
 
+    # build the graph of legal pairings for makePairings: one vertex per player, plus a bye
+    # vertex for odd fields, weighted so that pairing across score groups costs more the further
+    # apart the groups are; players must be laid out by score group, with group[i] the group of
+    # players[i] and groupIds[g] the ids in group g
+    # with adjacentOnly, players are only connected to the nearest pairingNeighbours legal
+    # opponents after them in their group and the next one, and only the lowest groups with
+    # players who haven't had a bye are connected to the bye
+    # with relaxed, every pair is connected, but a legal pair is worth more than any number of
+    # better-matched rematches, so the fewest rematches (and repeat byes) possible are made
+    # returns (edges, number of vertices, bye vertex or None)
+    def pairingGraph(self, players, group, groupIds, adjacentOnly, relaxed=False):
+        numPlayers = len(players)
+        lowestGroup = len(groupIds) - 1
+        # all weights must stay positive, so offset them by the largest possible penalty
+        maxPenalty = 2 * lowestGroup * lowestGroup + 1
+        legalBonus = 0
+        if relaxed:
+            legalBonus = maxPenalty * (numPlayers + 1)
+
+        index = {}
+        for i in range(numPlayers):
+            index[players[i].id] = i
+        candidates = set(index)
+        # position after the end of each group in the layout
+        groupEnds = []
+        for ids in groupIds:
+            groupEnds.append(len(ids) + (groupEnds[-1] if len(groupEnds) > 0 else 0))
+        edges = []
+        for i in range(numPlayers):
+            if adjacentOnly:
+                # only the nearest legal opponents after the player in the layout, which is
+                # shuffled within groups, so the graph grows with the field rather than its square
+                end = groupEnds[min(group[i] + 1, lowestGroup)]
+                opponentIds = players[i].opponentIds
+                numNeighbours = 0
+                j = i + 1
+                while j < end and numNeighbours < self.pairingNeighbours:
+                    if players[j].id not in opponentIds:
+                        penalty = (group[j] - group[i]) ** 2
+                        edges.append((i, j, maxPenalty - penalty))
+                        numNeighbours += 1
+                    j += 1
+                continue
+            legal = [index[pid] for pid in players[i].legalOpponents(candidates)]
+            if relaxed:
+                legal = set(legal)
+                for j in range(i + 1, numPlayers):
+                    penalty = (group[j] - group[i]) ** 2
+                    edges.append((i, j, maxPenalty - penalty + (legalBonus if j in legal else 0)))
+                continue
+            for j in sorted(j for j in legal if j > i):
+                penalty = (group[j] - group[i]) ** 2
+                edges.append((i, j, maxPenalty - penalty))
+
+        byeVertex = None
+        numVertices = numPlayers
+        if numPlayers % 2 == 1:
+            # the bye goes to a player in the lowest group who hasn't had one yet
+            byeVertex = numPlayers
+            numVertices += 1
+            lowestEligible = None
+            for i in reversed(range(numPlayers)):
+                penalty = 2 * (lowestGroup - group[i]) ** 2
+                if not players[i].hasPlayed(self.byePlayer):
+                    if lowestEligible == None:
+                        lowestEligible = group[i]
+                    if adjacentOnly and group[i] < lowestEligible - 1:
+                        break
+                    edges.append((i, byeVertex, maxPenalty - penalty + legalBonus))
+                elif relaxed:
+                    edges.append((i, byeVertex, maxPenalty - penalty))
+        return edges, numVertices, byeVertex
+
+    # returns the total penalty for pairing across score groups (see pairingGraph) of a matching
+    # of makePairings' graph
+    def pairingPenalty(self, group, mate, byeVertex):
+        lowestGroup = max(group)
+        penalty = 0
+        for i in range(len(group)):
+            if mate[i] == byeVertex:
+                penalty += 2 * (lowestGroup - group[i]) ** 2
+            elif mate[i] > i:
+                penalty += (group[mate[i]] - group[i]) ** 2
+        return penalty
+
+    # returns a lower bound on the penalty of any pairing of players laid out by score group:
+    # when an odd number of players are above the boundary between two groups, some pair must
+    # cross it, and a pair (or bye) crossing n boundaries costs at least n
+    def penaltyBound(self, groupIds):
+        bound = 0
+        numAbove = 0
+        for ids in groupIds[:-1]:
+            numAbove += len(ids)
+            bound += numAbove % 2
+        return bound
+
+    # check whether the next round can be paired without rematches or repeat byes, by finding
+    # the largest number of legal pairs that can be made at once; that is a maximum-cardinality
+    # matching, which is much quicker to find than the best pairing
+    # returns (the fewest rematches and repeat byes any pairing needs, the participants left
+    # unpaired by one of the largest legal pairings); the number is 0 if a pairing exists
+    def checkPairings(self):
+        if profiler != None: start = time.time()
+        players = list(self.participants)
+        ids = set(p.id for p in players)
+        edges, numVertices, byeVertex = self.pairingGraph(players, [0] * len(players), [ids], False)
+        mate = maxWeightMatching([(i, j, 1) for i, j, weight in edges], True)
+        mate.extend([-1] * (numVertices - len(mate)))
+        if profiler != None: profiler.addTime("pairing_check", time.time() - start)
+        unpaired = [players[i] for i in range(len(players)) if mate[i] == -1]
+        return mate.count(-1) // 2, unpaired
+
+    # pair a round that can't be paired without rematches: report how many rematches are needed
+    # and who can't be paired, then make the pairing with the fewest rematches, or in interactive
+    # mode, let the user choose to make pairings manually instead
+    def relaxPairings(self, numForced, unpaired):
+        self.printPairingCheck(numForced, unpaired)
+        if self.interactive:
+            s = raw_input("Pair with as few rematches as possible? Otherwise, pairings are made manually (y/n) ")
+            if s.lower() != "yes" and s.lower() != "y":
+                return False, False
+        if profiler != None: profiler.count("pairing_relaxed")
+        return self.makePairings(numForced)
+
+    # returns the number of rematches and repeat byes in a matching of makePairings' graph
+    def countRematches(self, players, mate, byeVertex):
+        count = 0
+        for i in range(len(players)):
+            if mate[i] == byeVertex:
+                if players[i].hasPlayed(self.byePlayer): count += 1
+            elif mate[i] > i and players[i].hasPlayed(players[mate[i]]):
+                count += 1
+        return count
+
+    # print the result of checkPairings
+    def printPairingCheck(self, numForced, unpaired):
+        if numForced == 0:
+            self.say("The next round can be paired without rematches.")
+            return
+        self.say("No pairings without rematches exist; at least", numForced, "rematch(es) or repeat bye(s) are needed.")
+        self.say("Participants who can't all be paired:", ", ".join(p.name for p in unpaired))
+
+    # re-pair the players left without a game this round by late drops and undrops, while the
+    # rest of the room keeps its tables
+    # the players whose opponent dropped and the players who came back are paired among themselves,
+    # together with the player who has the bye if that evens them out; if that isn't possible,
+    # the unreported matches closest to them in points are opened up too, a few more at a time
+    # returns False if there is nothing to repair or no pairing without rematches exists
+    def repairPairings(self):
+        if not self.isSwiss or self.roundNumber == 0:
+            return False
+        active = set(p.id for p in self.participants)
+        # forfeited matches are broken up, freeing whichever of their players are still in
+        removed = [m for m in self.matches if m in self.forfeits]
+        pool = [p for m in removed for p in (m.player1, m.player2) if p.id in active]
+        pool.extend(p for p in self.participants if p.id not in self.roundMatches)
+        if len(pool) == 0:
+            self.say("Nothing to repair.")
+            return False
+        if profiler != None: start = time.time()
+        for m in removed:
+            self.unreport(m)
+
+        # matches that can be opened up, nearest in points to the freed players first
+        poolPoints = set(p.matchPoints() for p in pool)
+        byeMatch = None
+        candidates = []
+        for m in self.matches:
+            if m.player2 is self.byePlayer:
+                if m.player1.id in active: byeMatch = m
+            elif not m.completed and m not in self.forfeits:
+                # forfeits being broken up are already in the pool
+                distance = min(abs(p.matchPoints() - points) for p in (m.player1, m.player2) for points in poolPoints)
+                candidates.append((distance, m))
+        candidates.sort(key=lambda c: c[0])
+
+        numOpened = 0
+        while True:
+            opened = [m for distance, m in candidates[:numOpened]]
+            # there can only be one bye, so an odd number of players takes back the current one
+            if byeMatch != None and (len(pool) + 2 * numOpened) % 2 == 1:
+                if byeMatch.completed:
+                    self.unreport(byeMatch)
+                opened.append(byeMatch)
+            matches = self.repairMatching(pool, opened)
+            if matches != None or numOpened == len(candidates):
+                break
+            if byeMatch != None and not byeMatch.completed:
+                byeMatch.report(byeMatch.player1.name, 2, 0, 0)
+                self.regroup(byeMatch)
+            numOpened = min(max(1, 2 * numOpened), len(candidates))
+        if profiler != None: profiler.addTime("repair", time.time() - start)
+
+        if matches == None:
+            # leave the round as it was
+            for m in removed + opened:
+                if not m.completed and (m in self.forfeits or m is byeMatch):
+                    m.report(m.player1.name, m.p1Wins, m.p2Wins, m.draws)
+                    self.regroup(m)
+            self.say("No repair without rematches exists for this round.")
+            return False
+        removed.extend(opened)
+        self.recordEvent({"event": "repair", "removed": [m.player1.name for m in removed],
+                          "matches": [[m.player1.name, m.player2.name] for m in matches if m.player2 is not self.byePlayer],
+                          "byes": [m.player1.name for m in matches if m.player2 is self.byePlayer]})
+        self.replaceMatches(removed, matches)
+        self.say("Repaired pairings:")
+        if self.output != None:
+            for m in matches:
+                m.printMatch(self.output)
+        return True
+
+    # pair the given players together with the players of the given open matches, without
+    # rematches and with the fewest float-downs; among equally good pairings, the one keeping
+    # the most of the open matches as they were is chosen
+    # returns the new matches (a bye is reported), or None if there is no such pairing
+    def repairMatching(self, pool, opened):
+        players = list(pool)
+        for m in opened:
+            players.append(m.player1)
+            if m.player2 is not self.byePlayer:
+                players.append(m.player2)
+        # number the groups as for the whole round, so float-downs cost the same
+        groupOf = {}
+        for points in self.getScoreGroups().scores():
+            groupOf[points] = len(groupOf)
+        players.sort(key=lambda p: groupOf[p.matchPoints()])
+        group = [groupOf[p.matchPoints()] for p in players]
+        groupIds = [set() for g in groupOf]
+        for i in range(len(players)):
+            groupIds[group[i]].add(players[i].id)
+        edges, numVertices, byeVertex = self.pairingGraph(players, group, groupIds, False)
+
+        # scale weights so that keeping a table only ever decides between equally good pairings
+        kept = set()
+        for m in opened:
+            kept.add((m.player1.id, m.player2.id))
+            kept.add((m.player2.id, m.player1.id))
+        scale = len(opened) + 1
+        for k in range(len(edges)):
+            i, j, weight = edges[k]
+            bonus = 0
+            if j != byeVertex and (players[i].id, players[j].id) in kept:
+                bonus = 1
+            edges[k] = (i, j, weight * scale + bonus)
+        mate = maxWeightMatching(edges, True)
+        if len(mate) != numVertices or -1 in mate:
+            return None
+
+        matches = []
+        for i in range(len(players)):
+            if mate[i] == byeVertex:
+                matches.append(Match(players[i], self.byePlayer))
+            elif mate[i] > i:
+                matches.append(Match(players[i], players[mate[i]]))
+        return matches
+
+    # replace some of this round's matches with new ones, taking back any results of the old
+    # ones; byes among the new matches are reported
+    def replaceMatches(self, removed, matches):
+        removed = set(removed)
+        for m in removed:
+            if m.completed:
+                self.unreport(m)
+        self.forfeits.difference_update(removed)
+        self.matches = [m for m in self.matches if m not in removed]
+        for m in matches:
+            if m.player2 is self.byePlayer:
+                m.report(m.player1.name, 2, 0, 0)
+                self.regroup(m)
+            self.matches.append(m)
+        self.indexMatches()
+        self.numCompleted = self.countCompleted()
+
     # manually create pairings
     def manualMakePairings(self):
-        self.participants.sort(cmp=comp)
+        self.participants = computeStandings(self.participants)
         self.matches = []
         numPaired = 0
         bracket = []
@@ -450,17 +1709,18 @@ class Tournament:
             players.append(p)
         # make pairings until all participants are paired
         self.printStandings()
-        print "Making pairings manually:"
+        self.say("Making pairings manually:")
         while numPaired < len(self.participants):
             if len(players) == 1:
-                m = Match(players[0], Participant("bye"))
+                m = Match(players[0], self.byePlayer)
                 m.report("bye", 0, 2, 0)
+                self.regroup(m)
                 self.matches.append(m)
                 numPaired += 1;
                 bye = True
                 players.remove(players[0])
                 break
-            print "Please enter participants with similar records for this bracket."
+            self.say("Please enter participants with similar records for this bracket.")
             # loop to choose participants for bracket
             while True:
                 s = raw_input("Please enter a participant name, or 'done' to finish: ")
@@ -472,11 +1732,11 @@ class Tournament:
                         players.remove(p)
                         break
             while(len(bracket) > 1):
-                p1 = random.randint(1, len(bracket) - 1)
+                p1 = self.random.randint(1, len(bracket) - 1)
                 player1 = bracket[0]
                 player2 = bracket[p1]
                 if len(bracket) == 2 and player1.hasPlayed(player2):
-                    print "Bracket failed, try again."
+                    self.say("Bracket failed, try again.")
                     self.printStandings()
                     self.matches = []
                     numPaired = 0
@@ -493,8 +1753,9 @@ class Tournament:
                 bracket.remove(player2)
                 numPaired += 2
                 if len(bracket) == 1:
-                    m = Match(bracket[0], Participant("bye"))
+                    m = Match(bracket[0], self.byePlayer)
                     m.report("bye", 0, 2, 0)
+                    self.regroup(m)
                     self.matches.append(m)
                     numPaired += 1;
                     bye = True
@@ -503,16 +1764,51 @@ class Tournament:
                     
 
     # data
+    seed = None
+    random = None
     participants = []
     dropped = []
+    droppedIds = set()
+    positions = {}
     isSwiss = None
     numRounds = 0
+    roundNumber = 0
+    numCompleted = 0
+    interactive = True
     matches = []
+    history = []
+    playersByName = {}
+    roundMatches = {}
+    forfeits = set()
+    byePlayer = None
+    scoreGroups = None
+    bracket = None
+    ratings = None
+    seedByRating = False
+    journal = None
+    pairingWorkers = 1
+    pairingTimeLimit = None
+    output = None
+    # number of legal opponents each player is connected to when pairing on the sparse graph
+    pairingNeighbours = 8
+    # participant fields kept in state files
+    playerFields = ("wins", "gameWins", "losses", "gameLosses", "draws", "gameDraws", "byes")
+    commands = ("help", "drop", "undrop", "report", "fix", "matches", "standings", "ratings", "export", "save", "check", "repair", "bracket", "done")
     helptext = """Commands:\n
 'matches': prints current status of matches this round
 'standings': prints current standings, including results from this round so far
+'standings [count]': prints only the first [count] places of the standings
+'export [csv|json] [filename]': writes the current standings to a file
+'ratings [count]': prints players' ratings, highest first (when ratings are kept)
+'export ratings [filename]': writes players' ratings to a CSV file
+'save [filename]': writes the whole tournament state to a file, to load with --load
+'bracket': prints the bracket so far (single elimination only)
 'drop [playername]': drops player; will forfeit any unreported matches with that player
 'undrop [playername]': returns a dropped player to the tournament
+'check': checks whether the next round can be paired without rematches, and if not,
+    which players can't be paired
+'repair': re-pairs players left without a match this round by drops or undrops,
+    keeping as many other tables as possible
 'report [p1wins] [p2wins] [draws] [p1name]': reports the final results of a match with 'p1name',
     where that player's wins are listed first; for example:
     'report 2 1 0 bob' reports that bob finished his match with 2 wins, 1 loss, and no draws
@@ -520,4 +1816,72 @@ class Tournament:
     'report 1 2 0 steve' has the same result
 'fix [p1wins] [p2wins] [draws] [p1name]': same use as report, but adjusts an already-reported match"""
 
-tournament = Tournament()
+# command line entry point
+# with no arguments the tournament is run interactively; given a file of participant names,
+# it runs without prompts, reading commands from a file or stdin
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run match pairings for a tournament.")
+    parser.add_argument("-p", "--players", help="file with one participant name per line, or a CSV or JSON Lines roster; runs without prompts")
+    parser.add_argument("-r", "--rounds", type=int, help="number of rounds (default: log2 of the number of participants)")
+    parser.add_argument("--single-elimination", action="store_true", help="run a single-elimination tournament instead of swiss")
+    parser.add_argument("-s", "--seed", type=int, help="seed for the tournament's random choices (default: chosen at random)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of processes used to search for pairings")
+    parser.add_argument("-t", "--time-limit", type=float, help="seconds to wait for the best pairing before using a faster approximate one")
+    parser.add_argument("--results", help="CSV or JSON Lines file of earlier rounds' results to load before pairing")
+    parser.add_argument("--load", help="state file written by the 'save' command to continue from")
+    parser.add_argument("--rated", action="store_true", help="keep Elo ratings, updated as results are reported")
+    parser.add_argument("--ratings", help="CSV or JSON Lines file of players' starting ratings (implies --rated)")
+    parser.add_argument("--seed-by-rating", action="store_true", help="pair the first round (or seed the bracket) by rating")
+    parser.add_argument("-j", "--journal", help="file to record events to, so the tournament can be resumed")
+    parser.add_argument("--resume", action="store_true", help="resume the tournament recorded in the journal")
+    parser.add_argument("--profile", help="collect timings and counters: 'log', 'json:PATH' or 'prometheus:PORT'")
+    parser.add_argument("commands", nargs="?", help="file of commands, one per line, as entered at the prompt (default: stdin)")
+    args = parser.parse_args(argv)
+
+    if args.profile != None:
+        enableProfiling(makeSink(args.profile))
+    if args.resume:
+        if args.journal == None:
+            parser.error("--resume needs a journal")
+        tournament = Tournament([])
+        tournament.resume(args.journal)
+    elif args.load != None:
+        tournament = Tournament([])
+        tournament.loadState(args.load)
+    elif args.players == None and args.results == None:
+        return Tournament(seed=args.seed)
+    else:
+        roster = []
+        if args.players != None:
+            roster = list(readRoster(args.players))
+        tournament = Tournament([name for name, dropped in roster], not args.single_elimination, args.rounds, args.seed)
+        for name, dropped in roster:
+            if dropped:
+                tournament.drop(tournament.playersByName[name])
+    if (args.rated or args.ratings != None) and tournament.ratings == None:
+        tournament.ratings = Ratings()
+        if args.ratings != None:
+            for name, rating in readRatings(args.ratings):
+                tournament.ratings.setRating(name, rating)
+    # earlier results are rated as they are loaded
+    if args.results != None and not args.resume and args.load == None:
+        tournament.importResults(readResults(args.results))
+        if args.rounds == None:
+            tournament.numRounds = max(tournament.numRounds, defaultRounds(len(tournament.participants)))
+    if args.seed_by_rating:
+        tournament.seedByRating = True
+    if args.journal != None and not args.resume:
+        tournament.startJournal(args.journal)
+    tournament.pairingWorkers = args.workers
+    tournament.pairingTimeLimit = args.time_limit
+    tournament.output = sys.stdout
+    if args.commands == None:
+        tournament.runScript(sys.stdin)
+    else:
+        tournament.runScript(open(args.commands))
+    if profiler != None:
+        profiler.flush()
+    return tournament
+
+if __name__ == "__main__":
+    main()
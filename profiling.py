@@ -0,0 +1,159 @@
+""" profiling.py
+    Opt-in timers and counters for finding out where the time in a round goes
+
+    pairings.py only records measurements while a Profiler is enabled with
+    pairings.enableProfiling; otherwise every measurement point is a single check for None.
+    Measurements are written to a sink: log lines, a JSON file, or Prometheus text served
+    over HTTP on a local port. """
+
+import BaseHTTPServer
+import json
+import sys
+import threading
+import time
+
+
+""" class collecting named counters and timers
+    a timer keeps the number of times it ran, the total time and the longest time """
+class Profiler:
+    def __init__(self, sink):
+        self.sink = sink
+        self.counters = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+        sink.attach(self)
+
+    # add n to a counter
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # record one run of a timer that took the given number of seconds
+    def addTime(self, name, seconds):
+        with self.lock:
+            if name not in self.timers:
+                self.timers[name] = [0, 0.0, 0.0]
+            timer = self.timers[name]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    # returns a copy of all measurements so far
+    def snapshot(self):
+        with self.lock:
+            timers = {}
+            for name, (count, total, longest) in self.timers.items():
+                timers[name] = {"count": count, "total": total, "max": longest}
+            return {"counters": dict(self.counters), "timers": timers}
+
+    # write the measurements so far to the sink
+    def flush(self):
+        self.sink.write(self.snapshot())
+
+    # data
+    sink = None
+    counters = {}
+    timers = {}
+    lock = None
+
+""" sink writing measurements as log lines to a stream (stderr by default) """
+class LogSink:
+    def __init__(self, stream=None):
+        if stream == None:
+            stream = sys.stderr
+        self.stream = stream
+
+    def attach(self, profiler):
+        pass
+
+    def write(self, measurements):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        for name in sorted(measurements["counters"]):
+            self.stream.write("%s profile %s count=%d\n" % (stamp, name, measurements["counters"][name]))
+        for name in sorted(measurements["timers"]):
+            timer = measurements["timers"][name]
+            self.stream.write("%s profile %s count=%d total=%.6f max=%.6f\n" % (stamp, name, timer["count"], timer["total"], timer["max"]))
+        self.stream.flush()
+
+    # data
+    stream = None
+
+""" sink writing measurements to a JSON file, replacing its contents on each write """
+class JsonSink:
+    def __init__(self, path):
+        self.path = path
+
+    def attach(self, profiler):
+        pass
+
+    def write(self, measurements):
+        f = open(self.path, "w")
+        json.dump(measurements, f, indent=2, sort_keys=True)
+        f.close()
+
+    # data
+    path = None
+
+# returns measurements in the Prometheus text format
+def prometheusText(measurements):
+    lines = []
+    for name in sorted(measurements["counters"]):
+        lines.append("# TYPE tournament_%s_total counter" % name)
+        lines.append("tournament_%s_total %d" % (name, measurements["counters"][name]))
+    for name in sorted(measurements["timers"]):
+        timer = measurements["timers"][name]
+        lines.append("# TYPE tournament_%s_seconds summary" % name)
+        lines.append("tournament_%s_seconds_count %d" % (name, timer["count"]))
+        lines.append("tournament_%s_seconds_sum %f" % (name, timer["total"]))
+        lines.append("# TYPE tournament_%s_seconds_max gauge" % name)
+        lines.append("tournament_%s_seconds_max %f" % (name, timer["max"]))
+    return "\n".join(lines) + "\n"
+
+""" sink serving the current measurements as Prometheus text over HTTP, on a local port
+    the server runs in a background thread and always shows the latest measurements """
+class PrometheusSink:
+    def __init__(self, port, host="127.0.0.1"):
+        self.port = port
+        self.host = host
+        self.profiler = None
+
+    def attach(self, profiler):
+        self.profiler = profiler
+        sink = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                text = prometheusText(sink.profiler.snapshot())
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.end_headers()
+                self.wfile.write(text)
+
+            # keep request logging out of the tournament output
+            def log_message(self, format, *args):
+                pass
+
+        self.server = BaseHTTPServer.HTTPServer((self.host, self.port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def write(self, measurements):
+        pass
+
+    # data
+    port = None
+    host = None
+    profiler = None
+    server = None
+
+# create a sink from a command line description: 'log', 'json:PATH' or 'prometheus:PORT'
+def makeSink(description):
+    if description == "log":
+        return LogSink()
+    kind, sep, arg = description.partition(":")
+    if kind == "json" and arg:
+        return JsonSink(arg)
+    if kind == "prometheus" and arg:
+        return PrometheusSink(int(arg))
+    raise ValueError("unknown profiling sink: " + description)
@@ -0,0 +1,154 @@
+""" ratings.py
+    Elo ratings for players across a season of events
+
+    A Ratings object is updated match by match as results are reported, and can seed the first
+    round of an event. A fixed result is corrected with the difference it makes to the rating
+    change, using the expected score the match was first rated with, so no history is replayed.
+    The ratings of a whole season can also be recomputed in one pass over the columns of the
+    events' state files (see bulk.py), in the order the events were played:
+        python ratings.py week1.state week2.state week3.state -o ratings.csv """
+
+import argparse
+import array
+import csv
+import sys
+
+from bulk import readColumns, readRows
+
+
+# returns the expected score of a player against an opponent, from their ratings
+def expectedScore(rating1, rating2):
+    return 1.0 / (1.0 + 10.0 ** ((rating2 - rating1) / 400.0))
+
+# returns the score of a match for the first player: 1 for a win, 0.5 for a draw, 0 for a loss
+def matchScore(wins1, wins2):
+    if wins1 > wins2:
+        return 1.0
+    if wins2 > wins1:
+        return 0.0
+    return 0.5
+
+""" class holding players' ratings by name, updated with the Elo system
+    each match is rated under a key, and keeps the expected score it was rated with until
+    it can no longer be fixed """
+class Ratings:
+    def __init__(self, initial=1500.0, k=32.0):
+        self.initial = initial
+        self.k = k
+        self.ratings = {}
+        # key -> [name1, name2, expected score of name1, score of name1]
+        self.rated = {}
+
+    # returns a player's rating; players without one start at the initial rating
+    def rating(self, name):
+        return self.ratings.get(name, self.initial)
+
+    # set a player's rating
+    def setRating(self, name, rating):
+        self.ratings[name] = rating
+
+    # rate a match result, where score1 is the first player's score (see matchScore)
+    def rate(self, key, name1, name2, score1):
+        expected1 = expectedScore(self.rating(name1), self.rating(name2))
+        self.rated[key] = [name1, name2, expected1, score1]
+        self.adjust(name1, name2, self.k * (score1 - expected1))
+
+    # correct the ratings for a match whose result was fixed
+    def fix(self, key, score1):
+        if key not in self.rated:
+            return
+        name1, name2, expected1, oldScore = self.rated[key]
+        self.rated[key] = [name1, name2, expected1, score1]
+        self.adjust(name1, name2, self.k * (score1 - oldScore))
+
+    # move rating points from the second player to the first
+    def adjust(self, name1, name2, change):
+        self.ratings[name1] = self.rating(name1) + change
+        self.ratings[name2] = self.rating(name2) - change
+
+    # forget the matches rated so far, once their results can no longer be fixed
+    def settle(self):
+        self.rated = {}
+
+    # returns (name, rating) for every rated player, highest first
+    def ranking(self):
+        return sorted(self.ratings.items(), key=lambda item: -item[1])
+
+    # write every rated player's rating to a stream as CSV, highest first
+    def write(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(["name", "rating"])
+        for name, rating in self.ranking():
+            writer.writerow([name, "%.1f" % rating])
+
+    # returns the ratings as plain data, for snapshots and state files
+    def getState(self):
+        return {"initial": self.initial, "k": self.k, "ratings": dict(self.ratings), "rated": dict(self.rated)}
+
+    # restore the ratings from data returned by getState
+    def setState(self, state):
+        self.initial = state["initial"]
+        self.k = state["k"]
+        self.ratings = dict(state["ratings"])
+        self.rated = dict(state["rated"])
+
+    # data
+    initial = 1500.0
+    k = 32.0
+    ratings = {}
+    rated = {}
+
+# generate (name, rating) for every player in a CSV or JSON Lines file with name and rating columns
+def readRatings(path):
+    for row in readRows(path):
+        yield row["name"].strip(), float(row["rating"])
+
+# recompute ratings over a season, from the columns of each event's state file in the order
+# the events were played; byes and forfeits aren't rated
+# ratings starts the season (for example, from last season's ratings) and is updated in place
+def seasonRatings(events, ratings):
+    for columns in events:
+        names = columns["players.name"]
+        # this event's ratings by participant position, so the matches can be rated from arrays
+        current = array.array("d", [ratings.rating(name) for name in names])
+        player1s, player2s = columns["matches.player1"], columns["matches.player2"]
+        wins1s, wins2s = columns["matches.wins1"], columns["matches.wins2"]
+        completed, forfeit = columns["matches.completed"], columns["matches.forfeit"]
+        k = ratings.k
+        for i in range(len(player1s)):
+            p1, p2 = player1s[i], player2s[i]
+            # byes are played against position -1
+            if p2 == -1 or not completed[i] or forfeit[i]:
+                continue
+            change = k * (matchScore(wins1s[i], wins2s[i]) - expectedScore(current[p1], current[p2]))
+            current[p1] += change
+            current[p2] -= change
+        # the last participant is the bye
+        for i in range(len(names) - 1):
+            ratings.setRating(names[i], current[i])
+    return ratings
+
+# command line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute Elo ratings over a season of events.")
+    parser.add_argument("events", nargs="+", help="state files of the season's events, in the order they were played")
+    parser.add_argument("--start", help="CSV or JSON Lines file of ratings to start the season from")
+    parser.add_argument("--initial", type=float, default=1500.0, help="rating of new players")
+    parser.add_argument("-k", type=float, default=32.0, help="largest rating change from one match")
+    parser.add_argument("-o", "--output", help="file to write ratings to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    ratings = Ratings(args.initial, args.k)
+    if args.start != None:
+        for name, rating in readRatings(args.start):
+            ratings.setRating(name, rating)
+    seasonRatings((readColumns(path)[1] for path in args.events), ratings)
+    out = sys.stdout
+    if args.output != None:
+        out = open(args.output, "wb")
+    ratings.write(out)
+    if out is not sys.stdout:
+        out.close()
+
+if __name__ == "__main__":
+    main()
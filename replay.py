@@ -0,0 +1,96 @@
+""" replay.py
+    Replays a recorded tournament from its journal, pairing every round again
+
+    The first line of a journal holds the state and random seed the tournament started from
+    (see Tournament.startJournal). From there each round is paired again, timed and compared
+    with the pairings that were recorded, and the recorded results, drops and repairs are
+    applied in between, so a slow or disputed round of a real event can be reproduced and
+    profiled. Writes one JSON object per round to stdout (or a file), for example:
+    {"round": 3, "active": 251, "pairingTime": 0.41, "paired": true, "same": true} """
+
+import argparse
+import json
+import sys
+import time
+
+import pairings
+from journal import readEvents
+from profiling import makeSink
+
+
+# returns this round's pairings as a set of sorted name pairs, with a bye as (name, None)
+def currentPairings(tournament):
+    pairs = set()
+    for m in tournament.matches:
+        if m.player2 is tournament.byePlayer:
+            pairs.add((m.player1.name, None))
+        else:
+            pairs.add(tuple(sorted((m.player1.name, m.player2.name))))
+    return pairs
+
+# returns the pairings of a recorded 'pair' event, in the same form as currentPairings
+def recordedPairings(event):
+    pairs = set(tuple(sorted(names)) for names in event["matches"])
+    pairs.update((name, None) for name in event["byes"])
+    return pairs
+
+# replay a journal, pairing each round with the given number of worker processes and time limit
+# returns a list with one dictionary of measurements per round
+def replay(path, workers=1, timeLimit=None):
+    events = readEvents(path)
+    first = next(events, None)
+    if first == None or first["event"] != "start":
+        raise ValueError("journal has no starting state: " + path)
+    tournament = pairings.Tournament([])
+    tournament.setState(first["state"])
+    tournament.pairingWorkers = workers
+    tournament.pairingTimeLimit = timeLimit
+
+    records = []
+    for event in events:
+        if event["event"] != "pair":
+            start = time.time()
+            tournament.applyEvent(event)
+            if event["event"] == "repair" and len(records) > 0:
+                records[-1]["repairTime"] = records[-1].get("repairTime", 0.0) + time.time() - start
+            continue
+        record = {"round": event["round"], "active": len(tournament.participants)}
+        before = tournament.getState()
+        start = time.time()
+        record["paired"] = tournament.pairRound()
+        record["pairingTime"] = time.time() - start
+        record["same"] = record["paired"] and currentPairings(tournament) == recordedPairings(event)
+        if not record["same"]:
+            # carry on from the recorded pairings, with the generator where pairing left it
+            after = tournament.random.getstate()
+            tournament.setState(before)
+            tournament.applyEvent(event)
+            tournament.random.setstate(after)
+        records.append(record)
+    return records
+
+# command line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded tournament, pairing every round again.")
+    parser.add_argument("journal", help="journal recorded with -j/--journal")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of processes used to search for pairings")
+    parser.add_argument("-t", "--time-limit", type=float, help="seconds to wait for the best pairing before using a faster approximate one")
+    parser.add_argument("--profile", help="collect timings and counters: 'log', 'json:PATH' or 'prometheus:PORT'")
+    parser.add_argument("-o", "--output", help="file to write results to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.profile != None:
+        pairings.enableProfiling(makeSink(args.profile))
+    records = replay(args.journal, args.workers, args.time_limit)
+    out = sys.stdout
+    if args.output != None:
+        out = open(args.output, "w")
+    for record in records:
+        out.write(json.dumps(record, sort_keys=True) + "\n")
+    if out is not sys.stdout:
+        out.close()
+    if pairings.profiler != None:
+        pairings.profiler.flush()
+
+if __name__ == "__main__":
+    main()
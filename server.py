@@ -0,0 +1,156 @@
+""" server.py
+    Hosts many tournaments at once in one process, taking commands over a local socket
+
+    Each connection sends one command per line, and gets back the command's output followed
+    by a line holding a single '.':
+        create [id] [swiss|se] [rounds|auto] [name],[name],...   starts a tournament and pairs round 1
+        list                                                     lists the running tournaments
+        [id] [command]                                           runs a tournament command, as at the prompt
+    Entering 'done' at the end of a round pairs the next one.
+    Commands for the same tournament are run one at a time; different tournaments don't wait on
+    each other, and pairing a large event can use worker processes (see pairings.Tournament). """
+
+import argparse
+import SocketServer
+import StringIO
+import threading
+
+import pairings
+
+
+""" class holding the running tournaments
+    each tournament has its own lock, so commands for one never wait for another """
+class TournamentService:
+    def __init__(self, workers=1, largeEvent=1000, timeLimit=None):
+        self.tournaments = {}
+        self.locks = {}
+        # only held while looking up or adding a tournament, never while running a command
+        self.registryLock = threading.Lock()
+        # events with at least largeEvent players search for pairings with this many processes
+        # and, if timeLimit is given, settle for a faster approximate pairing after that many seconds
+        self.workers = workers
+        self.largeEvent = largeEvent
+        self.timeLimit = timeLimit
+
+    # start a tournament and pair its first round; returns the printed output
+    def create(self, tournamentId, names, swiss, rounds):
+        tournament = pairings.Tournament(names, swiss, rounds)
+        if len(names) >= self.largeEvent:
+            tournament.pairingWorkers = self.workers
+            tournament.pairingTimeLimit = self.timeLimit
+        lock = threading.Lock()
+        with self.registryLock:
+            if tournamentId in self.tournaments:
+                return "Tournament %s already exists.\n" % tournamentId
+            self.tournaments[tournamentId] = tournament
+            self.locks[tournamentId] = lock
+        with lock:
+            return self.captured(tournament, tournament.pairRound)
+
+    # run a command for a tournament; returns the printed output
+    def execute(self, tournamentId, command):
+        with self.registryLock:
+            tournament = self.tournaments.get(tournamentId)
+            lock = self.locks.get(tournamentId)
+        if tournament == None:
+            return "No tournament %s.\n" % tournamentId
+        with lock:
+            return self.captured(tournament, self.runCommand, tournament, command)
+
+    # run a command, and pair the next round if it ended the current one
+    def runCommand(self, tournament, command):
+        if tournament.runCommand(command):
+            if tournament.roundNumber < tournament.numRounds:
+                tournament.pairRound()
+            else:
+                tournament.printStandings()
+                tournament.say("Tournament complete!")
+
+    # returns the ids of all running tournaments
+    def tournamentIds(self):
+        with self.registryLock:
+            return sorted(self.tournaments)
+
+    # call a function, returning what the tournament printed meanwhile
+    # the caller holds the tournament's lock, so no other command writes to the same output
+    def captured(self, tournament, function, *args):
+        tournament.output = StringIO.StringIO()
+        try:
+            function(*args)
+            return tournament.output.getvalue()
+        finally:
+            tournament.output = None
+
+    # data
+    tournaments = {}
+    locks = {}
+    registryLock = None
+    workers = 1
+    largeEvent = 1000
+    timeLimit = None
+
+""" class handling one connection: reads commands line by line and writes back their output """
+class CommandHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            words = line.split(None, 1)
+            if len(words) == 0:
+                continue
+            try:
+                if words[0] == "create":
+                    response = self.create(service, line)
+                elif words[0] == "list":
+                    response = "".join(t + "\n" for t in service.tournamentIds())
+                elif len(words) == 2:
+                    response = service.execute(words[0], words[1])
+                else:
+                    response = "Unknown command.\n"
+            except (ValueError, IndexError):
+                response = "Invalid command.\n"
+            except Exception, e:
+                # any other failure is reported, so the client always gets its terminating line
+                response = "Error: %s\n" % e
+            self.wfile.write(response + ".\n")
+            self.wfile.flush()
+
+    # parse and run a 'create' command
+    def create(self, service, line):
+        words = line.split(None, 4)
+        rounds = None
+        if words[3] != "auto":
+            rounds = int(words[3])
+        names = [name.strip() for name in words[4].split(",") if name.strip()]
+        return service.create(words[1], names, words[2] != "se", rounds)
+
+""" threaded TCP server; each connection is handled in its own thread """
+class TournamentServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, service):
+        SocketServer.TCPServer.__init__(self, address, CommandHandler)
+        self.service = service
+
+# command line entry point
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many tournaments, taking commands over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="processes used to pair large events")
+    parser.add_argument("--large-event", type=int, default=1000, help="number of players from which an event counts as large")
+    parser.add_argument("-t", "--time-limit", type=float, help="seconds to wait for the best pairing of a large event before using a faster approximate one")
+    args = parser.parse_args(argv)
+
+    service = TournamentService(args.workers, args.large_event, args.time_limit)
+    server = TournamentServer((args.host, args.port), service)
+    print "Serving tournaments on %s:%d" % (args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
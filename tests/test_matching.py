@@ -0,0 +1,112 @@
+""" test_matching.py
+    Tests for the maximum-weight matching used to pair rounds, against brute force on small
+    graphs and on a large field over several rounds
+    run from the repository root with: python -m unittest discover tests """
+
+import random
+import unittest
+
+import pairings
+from matching import matchingScore, maxWeightMatching, parallelMatching
+
+
+# returns the best (number of matched edges, total weight) of any matching of a small graph
+# with maxCardinality, or (total weight,) of the heaviest one otherwise, by trying them all
+def bruteForceScore(numVertices, edges, maxCardinality):
+    def best(v, used):
+        if v == numVertices:
+            return (0, 0)
+        if v in used:
+            return best(v + 1, used)
+        result = best(v + 1, used)
+        # v is matched to a later vertex, or left unmatched
+        for i, j, w in edges:
+            other = j if i == v else i
+            if v in (i, j) and other > v and other not in used:
+                count, weight = best(v + 1, used | set([other]))
+                result = max(result, (count + 1, weight + w), key=lambda score: score if maxCardinality else score[1])
+        return result
+    count, weight = best(0, set())
+    if maxCardinality:
+        return (count, weight)
+    return (weight,)
+
+
+class MatchingTest(unittest.TestCase):
+    # the matching found on random small graphs is as good as the best one there is
+    def testAgainstBruteForce(self):
+        rng = random.Random(0)
+        for trial in range(1500):
+            numVertices = rng.randint(2, 9)
+            edges = [(i, j, rng.randint(1, 12)) for i in range(numVertices) for j in range(i + 1, numVertices)
+                     if rng.random() < 0.5]
+            if len(edges) == 0:
+                continue
+            for maxCardinality in (False, True):
+                mate = maxWeightMatching(edges, maxCardinality)
+                mate.extend([-1] * (numVertices - len(mate)))
+                for v in range(numVertices):
+                    if mate[v] != -1:
+                        self.assertEqual(mate[mate[v]], v)
+                count, weight = matchingScore(edges, mate)
+                score = (weight,)
+                if maxCardinality:
+                    score = (count, weight)
+                self.assertEqual(score, bruteForceScore(numVertices, edges, maxCardinality), repr(edges))
+
+    # the parallel search returns the whole graph's matching unless a sparser graph's perfect
+    # matching is known to be optimal
+    def testParallelMatching(self):
+        rng = random.Random(1)
+        numVertices = 60
+        edges = [(i, j, 100 - abs(i - j)) for i in range(numVertices) for j in range(i + 1, numVertices)
+                 if rng.random() < 0.5]
+        best = matchingScore(edges, maxWeightMatching(edges, True))
+        mate = parallelMatching(edges, numVertices, 3, optimal=lambda mate: False)
+        self.assertEqual(matchingScore(edges, mate), best)
+        mate = parallelMatching(edges, numVertices, 3, optimal=lambda mate: True)
+        self.assertEqual(len(mate), numVertices)
+        self.assertNotIn(-1, mate)
+
+
+class LargeFieldTest(unittest.TestCase):
+    # blossoms nest deeply in large fields; pairing must neither fail nor make a rematch
+    def testLargeField(self):
+        rng = random.Random(2)
+        tournament = pairings.Tournament(["p%d" % i for i in range(3000)], True, 8, 2)
+        for r in range(3):
+            self.assertTrue(tournament.pairRound())
+            seen = set()
+            for m in tournament.matches:
+                for p in (m.player1, m.player2):
+                    if p is not tournament.byePlayer:
+                        self.assertNotIn(p.id, seen)
+                        seen.add(p.id)
+                self.assertEqual(m.player1.opponentIds.get(m.player2.id, 0), 1 if m.completed else 0)
+                if not m.completed:
+                    tournament.report(m.player1.name, rng.randint(0, 2), rng.randint(0, 2), 0)
+            self.assertEqual(len(seen), len(tournament.participants))
+
+    # a pairing that raises leaves the tournament as it was, so the round can be paired again
+    def testPairingErrorLeavesRound(self):
+        tournament = pairings.Tournament(["p%d" % i for i in range(20)], True, 5, 3)
+        tournament.pairRound()
+        for m in tournament.matches:
+            if not m.completed:
+                tournament.report(m.player1.name, 2, 0, 0)
+        before = tournament.getState()
+
+        def fail(*args):
+            raise RuntimeError("matching failed")
+        original = pairings.maxWeightMatching
+        pairings.maxWeightMatching = fail
+        try:
+            self.assertRaises(RuntimeError, tournament.pairRound)
+        finally:
+            pairings.maxWeightMatching = original
+        self.assertEqual(tournament.getState(), before)
+        self.assertTrue(tournament.pairRound())
+        self.assertEqual(tournament.roundNumber, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+""" test_ratings.py
+    Regression tests for recomputing ratings from state files
+    run from the repository root with: python -m unittest discover tests """
+
+import random
+import unittest
+
+import pairings
+from ratings import Ratings, seasonRatings
+
+
+class SeasonRatingsTest(unittest.TestCase):
+    # check that recomputing the ratings from a tournament's columns gives the ratings it kept
+    # as results were reported
+    def checkRatings(self, tournament):
+        recomputed = seasonRatings([tournament.getColumns()[1]], Ratings())
+        for p in tournament.participants + tournament.dropped:
+            self.assertAlmostEqual(tournament.ratings.rating(p.name), recomputed.rating(p.name), 6, p.name)
+
+    # report every open match of the round
+    def reportRound(self, tournament, rng):
+        for m in tournament.matches:
+            if not m.completed:
+                tournament.report(m.player1.name, rng.randint(0, 2), rng.randint(0, 2), 0)
+
+    # a player dropping in round 1 forfeits their match, which isn't rated then or after
+    def testEarlierRoundForfeit(self):
+        rng = random.Random(0)
+        tournament = pairings.Tournament(list("abcdefg"), True, 3, 1)
+        tournament.ratings = Ratings()
+        tournament.pairRound()
+        match = [m for m in tournament.matches if m.player2 is not tournament.byePlayer][0]
+        tournament.drop(match.player1)
+        self.reportRound(tournament, rng)
+        tournament.pairRound()
+        self.reportRound(tournament, rng)
+        self.checkRatings(tournament)
+
+    # play events with drops in every round, checking the ratings after each
+    def testDropsEveryRound(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            tournament = pairings.Tournament(["p%d" % i for i in range(rng.randint(7, 25))], True, 5, seed)
+            tournament.ratings = Ratings()
+            while tournament.roundNumber < tournament.numRounds and len(tournament.participants) > 3:
+                if not tournament.pairRound():
+                    break
+                tournament.drop(rng.choice(tournament.participants))
+                self.reportRound(tournament, rng)
+                self.checkRatings(tournament)
+
+if __name__ == "__main__":
+    unittest.main()
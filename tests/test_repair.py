@@ -0,0 +1,57 @@
+""" test_repair.py
+    Regression tests for repairing a round's pairings after late drops and undrops
+    run from the repository root with: python -m unittest discover tests """
+
+import random
+import unittest
+
+import pairings
+
+
+class RepairTest(unittest.TestCase):
+    # check that every active participant has exactly one match, and that dropped participants
+    # have no open match
+    def checkRound(self, tournament):
+        active = set(p.id for p in tournament.participants)
+        seen = set()
+        for m in tournament.matches:
+            for p in (m.player1, m.player2):
+                if p is tournament.byePlayer:
+                    continue
+                self.assertNotIn(p.id, seen, "%s has two matches" % p.name)
+                seen.add(p.id)
+                if not m.completed:
+                    self.assertIn(p.id, active, "dropped %s has an open match" % p.name)
+        self.assertTrue(active <= seen)
+
+    # play events where some players drop after pairing, and some of them come straight back,
+    # repairing the round each time
+    def playEvents(self, undrop):
+        for seed in range(40):
+            rng = random.Random(seed)
+            tournament = pairings.Tournament(["p%d" % i for i in range(rng.randint(8, 30))], True, 6, seed)
+            while tournament.roundNumber < tournament.numRounds and len(tournament.participants) > 4:
+                if not tournament.pairRound():
+                    break
+                for m in tournament.matches[:len(tournament.matches) // 3]:
+                    if not m.completed:
+                        tournament.report(m.player1.name, 2, rng.randint(0, 1), 0)
+                dropped = rng.sample(tournament.participants, 2)
+                for p in dropped:
+                    tournament.drop(p)
+                if undrop:
+                    tournament.undrop(dropped[0])
+                tournament.repairPairings()
+                self.checkRound(tournament)
+                for m in tournament.matches:
+                    if not m.completed:
+                        tournament.report(m.player1.name, rng.randint(0, 2), 1, 0)
+
+    def testDropThenRepair(self):
+        self.playEvents(False)
+
+    def testDropUndropThenRepair(self):
+        self.playEvents(True)
+
+if __name__ == "__main__":
+    unittest.main()